@@ -1,35 +1,40 @@
-import json
+import asyncio
+import logging
+import queue
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from http import HTTPStatus
 import os
 import tempfile
+from threading import Thread
 from typing import Optional
 
 import pandas as pd
+import torch
 from config.celery_config import celery_app
-from database.event import Event
-from database.repository import GenericRepository
 from services.reranker_service import RerankerRoberta, RerankerLaBSE
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Body, Depends
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Body
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.responses import Response
 
-from api.dependencies import db_session
 from api.event_schema import EventSchema
 from timescale_vector.client import uuid_from_time
 
 from config.settings import get_settings
 from utils.document_process import read_txt, read_docx, read_pdf, chunk_text
-from services.llm_factory import LLMFactory
+from services.llm_factory import LLMFactory, load_fast_tokenizer
 from pydantic import BaseModel, Field
 from services.milvus_vector_store import MilvusVectorStore
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+from transformers import T5ForConditionalGeneration, TextIteratorStreamer
 import sentencepiece
 
 EMBEDDING_MODEL = "openai"  # Варианты: "roberta" или "openai"
 ANSWER_MODEL = "t5"  # Варианты: "t5" или "openai"
+EMBEDDING_WINDOW = 256  # Количество чанков в одном батче эмбеддингов при загрузке документа
+UPLOAD_READ_SIZE = 1 << 20  # Размер блока (байт) при записи загружаемого файла на диск
+RERANK_MIN_CANDIDATES = 10  # Реранкинг выполняется только если кандидатов больше этого числа
+STREAM_TOKEN_TIMEOUT = 60  # Сколько секунд поток ответа T5 ждет следующий фрагмент текста
 
 """
 Event Submission Endpoint Module
@@ -37,9 +42,8 @@ Event Submission Endpoint Module
 This module defines the primary FastAPI endpoint for event ingestion.
 It implements the initial handling of incoming events by:
 1. Validating the incoming event data
-2. Persisting the event to the database
-3. Queuing an asynchronous processing task
-4. Returning an acceptance response
+2. Queuing an asynchronous task that persists and processes the event
+3. Returning an acceptance response
 
 The endpoint follows the "accept-and-delegate" pattern where:
 - Events are immediately accepted if valid
@@ -53,20 +57,121 @@ while allowing for potentially long-running processing operations.
 router = APIRouter()
 
 
+@lru_cache(maxsize=4)
+def _get_vector_store(embedding_model: str) -> MilvusVectorStore:
+    """
+    Returns a process-wide MilvusVectorStore per embedding model, so the connection
+    and collection load happen once instead of on every request.
+    """
+    return MilvusVectorStore(embedding_model=embedding_model)
+
+
+SEARCH_RESULT_COLUMNS = ["id", "category", "contents", "created_at", "distance"]
+
+
+def _to_records(df: pd.DataFrame) -> list[dict]:
+    """
+    Converts vector search results to a list of dicts in a single pass.
+    """
+    if df.empty:
+        return []
+    return df[SEARCH_RESULT_COLUMNS].to_dict(orient="records")
+
+
+@lru_cache(maxsize=1)
+def _get_t5():
+    """
+    Loads the T5 QA tokenizer and model once per process and reuses them across requests.
+
+    On GPU the weights are loaded in FP16; on CPU the Linear layers are
+    dynamically quantized to int8, which speeds up generate() with negligible quality loss.
+    """
+    tokenizer = load_fast_tokenizer("Kyrmasch/t5-kazakh-qa")
+    if torch.cuda.is_available():
+        model = T5ForConditionalGeneration.from_pretrained("Kyrmasch/t5-kazakh-qa", torch_dtype=torch.float16)
+        model = model.to("cuda").eval()
+    else:
+        model = T5ForConditionalGeneration.from_pretrained("Kyrmasch/t5-kazakh-qa").eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+
+def _generate_t5(model, **kwargs):
+    """
+    Runs T5 generate() without autograd bookkeeping; safe to call from a worker thread.
+    """
+    with torch.inference_mode():
+        return model.generate(**kwargs)
+
+
+def _stream_t5(model, streamer: TextIteratorStreamer, errors: list, **kwargs) -> None:
+    """
+    Runs a streamed T5 generate() in a worker thread. If generation fails, the error is
+    recorded in `errors` and the stream is ended, so the client is not left waiting.
+    """
+    try:
+        _generate_t5(model, streamer=streamer, **kwargs)
+    except Exception as e:
+        logging.exception("T5 streaming generation failed")
+        errors.append(str(e))
+        streamer.end()
+
+
+def _sse_frame(text: str, event: Optional[str] = None) -> str:
+    """Formats one Server-Sent Events frame; every line of the text becomes a data: field."""
+    header = f"event: {event}\n" if event else ""
+    return header + "".join(f"data: {line}\n" for line in text.split("\n")) + "\n"
+
+
+def _sse_t5_stream(streamer: TextIteratorStreamer, errors: list):
+    """
+    Yields streamed T5 text as SSE frames, followed by an `error` event if generation
+    failed or stalled for STREAM_TOKEN_TIMEOUT, or a final `end` event otherwise.
+    """
+    try:
+        for text in streamer:
+            if text:
+                yield _sse_frame(text)
+    except queue.Empty:
+        yield _sse_frame("generation timed out", event="error")
+        return
+
+    if errors:
+        yield _sse_frame(errors[0], event="error")
+    else:
+        yield _sse_frame("", event="end")
+
+
+@lru_cache(maxsize=1)
+def _get_reranker() -> RerankerLaBSE:
+    """
+    Loads the LaBSE reranker once per process and reuses it across requests.
+    """
+    return RerankerLaBSE()
+
+
+def _rerank(query: str, documents: list[dict], top_k: int) -> list[dict]:
+    """
+    Reranks retrieved documents, skipping the model when there are too few candidates
+    for reranking to change what ends up in the context.
+    """
+    if len(documents) <= RERANK_MIN_CANDIDATES:
+        return documents[:top_k]
+    return _get_reranker()(query, documents, top_k=min(top_k, len(documents)))
+
+
 @router.post("/", dependencies=[])
 def handle_event(
         data: EventSchema,
-        session: Session = Depends(db_session),
 ) -> Response:
     """Handles incoming event submissions.
 
-    This endpoint receives events, stores them in the database,
-    and queues them for asynchronous processing. It implements
-    a non-blocking pattern to ensure API responsiveness.
+    This endpoint receives events and queues them for asynchronous
+    processing. The event row is written by the Celery worker, so the
+    request path only pays for the broker enqueue.
 
     Args:
         data: The event data, validated against EventSchema
-        session: Database session injected by FastAPI dependency
 
     Returns:
         Response: 202 Accepted response with task ID
@@ -75,23 +180,18 @@ def handle_event(
         The endpoint returns immediately after queueing the task.
         Use the task ID in the response to check processing status.
     """
-    # Store event in database
-    repository = GenericRepository(
-        session=session,
-        model=Event,
-    )
-    event = Event(data=data.model_dump(mode="json"))
-    repository.create(obj=event)
+    # Assign the event ID up front; the worker persists the event under it
+    event_id = uuid.uuid1()
 
     # Queue processing task
     task_id = celery_app.send_task(
         "process_incoming_event",
-        args=[str(event.id)],
+        args=[str(event_id), data.model_dump(mode="json")],
     )
 
     # Return acceptance response
-    return Response(
-        content=json.dumps({"message": f"process_incoming_event started `{task_id}` "}),
+    return ORJSONResponse(
+        content={"message": f"process_incoming_event started `{task_id}` "},
         status_code=HTTPStatus.ACCEPTED,
     )
 
@@ -102,6 +202,7 @@ rag_router = APIRouter()
 class QuestionRequest(BaseModel):
     question: str = Field(..., description="Вопрос для модели")
     model: str = Field(..., description="Модель")
+    stream: bool = Field(default=False, description="Возвращать ответ T5 потоком токенов")
 
 
 class ResponseModel(BaseModel):
@@ -123,27 +224,15 @@ def ask(request: QuestionRequest = Body(...)) -> Response:
     try:
 
         if request.model == "t5":
-            vector_store = MilvusVectorStore(embedding_model="roberta")
+            vector_store = _get_vector_store("roberta")
             df = vector_store.search(request.question, top_k=5)
 
-            results = [
-                {
-                    "id": row["id"],
-                    "category": row["category"],
-                    "contents": row["contents"],
-                    "created_at": row["created_at"],
-                    "distance": row["distance"]
-                }
-                for _, row in df.iterrows()
-            ]
-            reranker = RerankerLaBSE()
-
-            reranked_docs = reranker(request.question, results, top_k=50)
+            results = _to_records(df)
+            reranked_docs = _rerank(request.question, results, top_k=50)
 
             context = " ".join([doc["contents"] for doc in reranked_docs])
 
-            tokenizer = T5Tokenizer.from_pretrained("Kyrmasch/t5-kazakh-qa")
-            model = T5ForConditionalGeneration.from_pretrained("Kyrmasch/t5-kazakh-qa")
+            tokenizer, model = _get_t5()
 
             encoded = tokenizer.encode_plus(
                 context, 
@@ -153,35 +242,37 @@ def ask(request: QuestionRequest = Body(...)) -> Response:
                 truncation=True, 
                 return_tensors="pt"
             )
-            input_ids = encoded["input_ids"].to('cpu')
-            attention_mask = encoded["attention_mask"].to('cpu')
-
-            output = model.generate(
-                input_ids=input_ids, 
-                attention_mask=attention_mask, 
-                max_length=128,
-                early_stopping=True,
-                num_beams=4,
-                no_repeat_ngram_size=2
+            input_ids = encoded["input_ids"].to(model.device)
+            attention_mask = encoded["attention_mask"].to(model.device)
+
+            generate_kwargs = dict(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                max_new_tokens=128,
+                num_beams=1,
+                do_sample=False,
+                use_cache=True
             )
+
+            if request.stream:
+                # Генерация идёт в фоновом потоке, клиент получает токены по мере декодирования
+                streamer = TextIteratorStreamer(
+                    tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_TOKEN_TIMEOUT
+                )
+                errors = []
+                Thread(
+                    target=_stream_t5, args=(model, streamer, errors), kwargs=dict(generate_kwargs), daemon=True
+                ).start()
+                return StreamingResponse(_sse_t5_stream(streamer, errors), media_type="text/event-stream")
+
+            output = _generate_t5(model, **generate_kwargs)
             answer = ''.join([tokenizer.decode(ids, skip_special_tokens=True) for ids in output])
         else:  # openai
-            vector_store = MilvusVectorStore(embedding_model=request.model)
+            vector_store = _get_vector_store(request.model)
             df = vector_store.search(request.question, top_k=25)
 
-            results = [
-                {
-                    "id": row["id"],
-                    "category": row["category"],
-                    "contents": row["contents"],
-                    "created_at": row["created_at"],
-                    "distance": row["distance"]
-                }
-                for _, row in df.iterrows()
-            ]
-            reranker = RerankerLaBSE()
-
-            reranked_docs = reranker(request.question, results, top_k=50)
+            results = _to_records(df)
+            reranked_docs = _rerank(request.question, results, top_k=50)
 
             context = " ".join([doc["contents"] for doc in reranked_docs])
 
@@ -201,17 +292,9 @@ def ask(request: QuestionRequest = Body(...)) -> Response:
             response, _ = llm.create_completion(AnswerModel, messages)
             answer = response.answer
 
-        return Response(
-            content=json.dumps({"answer": answer}, ensure_ascii=False),
-            status_code=HTTPStatus.OK,
-            media_type="application/json"
-        )
+        return ORJSONResponse(content={"answer": answer}, status_code=HTTPStatus.OK)
     except Exception as e:
-        return Response(
-            content=json.dumps({"error": str(e)}, ensure_ascii=False),
-            status_code=HTTPStatus.INTERNAL_SERVER_ERROR,
-            media_type="application/json"
-        )
+        return ORJSONResponse(content={"error": str(e)}, status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
 @rag_router.post("/documents/upload")
@@ -223,27 +306,42 @@ async def upload_document(
     Uploads a document (TXT, DOCX, PDF), extracts its text content,
     creates embeddings, and stores them in Milvus.
     """
-    vector_store = MilvusVectorStore(embedding_model=model)
+    vector_store = await asyncio.to_thread(_get_vector_store, model)
     ext = file.filename.split(".")[-1].lower()
     filename_without_ext = ".".join(file.filename.split(".")[:-1]) or file.filename
-    content = await file.read()
-
-    if ext == "txt":
-        text = read_txt(content)
-    elif ext == "docx":
-        text = read_docx(content)
-    elif ext == "pdf":
-        text = read_pdf(content)
-    elif ext == "json":
-        text = content.decode("utf-8")  # or process as needed
-    else:
+
+    if ext not in ("txt", "docx", "pdf", "json"):
         return {"error": f"Unsupported file type: {ext}"}
 
+    # Загружаемый файл пишется на диск частями, а не читается в память целиком;
+    # запись идет в пуле потоков, а временный файл удаляется и при ошибке записи
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{ext}")
+    path = tmp.name
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_READ_SIZE):
+                await asyncio.to_thread(tmp.write, chunk)
+
+        if ext == "docx":
+            text = await asyncio.to_thread(read_docx, path)
+        elif ext == "pdf":
+            text = await asyncio.to_thread(read_pdf, path)
+        else:  # txt, json
+            text = await asyncio.to_thread(read_txt, path)
+    finally:
+        os.remove(path)
+
     chunks = chunk_text(text)
+
+    # Embedding и вставка выполняются в пуле потоков, чтобы не блокировать event loop
+    windows = [chunks[i:i + EMBEDDING_WINDOW] for i in range(0, len(chunks), EMBEDDING_WINDOW)]
+    batches = await asyncio.gather(
+        *(asyncio.to_thread(vector_store.get_embeddings, window) for window in windows)
+    )
+    embeddings = [embedding for batch in batches for embedding in batch]
     records = []
 
-    for chunk in chunks:
-        embedding = vector_store.get_embedding(chunk)
+    for chunk, embedding in zip(chunks, embeddings):
         records.append({
             "id": str(uuid.uuid4()),
             "category": filename_without_ext,
@@ -253,44 +351,33 @@ async def upload_document(
         })
 
     df = pd.DataFrame(records)
-    vector_store.insert(df)
+    await asyncio.to_thread(vector_store.insert, df)
 
     return {"message": f"Документ загружен '{file.filename}'"}
 
 
 @rag_router.post("/documents/search", dependencies=[])
-def document_search(request: SearchRequest) -> Response:
+async def document_search(request: SearchRequest) -> Response:
     """
     Performs a semantic search against the stored document chunks
     using a vector similarity search based on the user's query.
     """
-    vector_store = MilvusVectorStore(embedding_model=request.model)
+    vector_store = await asyncio.to_thread(_get_vector_store, request.model)
     if vector_store.is_connected:
-        result = vector_store.search(query=request.query, top_k=50)
+        result = await vector_store.asearch(query=request.query, top_k=50)
 
         if result.empty:
-            return JSONResponse(status_code=200, content={"results": []})
-
-        results = [
-            {
-                "id": row["id"],
-                "category": row["category"],
-                "contents": row["contents"],
-                "created_at": row["created_at"],
-                "distance": row["distance"]
-            }
-            for _, row in result.iterrows()
-        ]
-        reranker = RerankerLaBSE()
-
-        reranked_docs = reranker(request.query, results, top_k=50)
-
-        return JSONResponse(
+            return ORJSONResponse(status_code=200, content={"results": []})
+
+        results = _to_records(result)
+        reranked_docs = await asyncio.to_thread(_rerank, request.query, results, 50)
+
+        return ORJSONResponse(
                 status_code=200,
                 content={"results": reranked_docs}
             )
     else:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=500,
             content={"error": "Подключение не установлено!"}
         )
\ No newline at end of file
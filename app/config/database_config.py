@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from typing import Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
@@ -19,6 +20,69 @@ class VectorStoreConfig(BaseSettings):
     embedding_dimensions: int = 1536
     time_partition_interval: timedelta = timedelta(days=7)
 
+    # Параметры индекса и поиска Milvus
+    # HNSW для коллекций, помещающихся в память; DISKANN — для корпусов больше RAM; GPU_CAGRA — для GPU-узлов
+    index_type: str = os.getenv("MILVUS_INDEX_TYPE", "HNSW")
+    metric_type: str = os.getenv("MILVUS_METRIC_TYPE", "IP")
+    hnsw_m: int = int(os.getenv("MILVUS_HNSW_M", "16"))
+    hnsw_ef_construction: int = int(os.getenv("MILVUS_HNSW_EF_CONSTRUCTION", "200"))
+    hnsw_ef: int = int(os.getenv("MILVUS_HNSW_EF", "64"))
+    ivf_nlist: int = int(os.getenv("MILVUS_IVF_NLIST", "1024"))
+    ivf_nprobe: int = int(os.getenv("MILVUS_IVF_NPROBE", "16"))
+    diskann_search_list: int = int(os.getenv("MILVUS_DISKANN_SEARCH_LIST", "100"))
+    # Параметры построения графа Vamana: R (max_degree) и L (search_list_size)
+    diskann_max_degree: int = int(os.getenv("MILVUS_DISKANN_MAX_DEGREE", "48"))
+    diskann_search_list_size: int = int(os.getenv("MILVUS_DISKANN_SEARCH_LIST_SIZE", "128"))
+    diskann_pq_code_budget_gb_ratio: float = float(os.getenv("MILVUS_DISKANN_PQ_CODE_BUDGET_GB_RATIO", "0.125"))
+    diskann_search_cache_budget_gb_ratio: float = float(os.getenv("MILVUS_DISKANN_SEARCH_CACHE_BUDGET_GB_RATIO", "0.1"))
+    cagra_intermediate_graph_degree: int = int(os.getenv("MILVUS_CAGRA_INTERMEDIATE_GRAPH_DEGREE", "64"))
+    cagra_graph_degree: int = int(os.getenv("MILVUS_CAGRA_GRAPH_DEGREE", "32"))
+    cagra_itopk_size: int = int(os.getenv("MILVUS_CAGRA_ITOPK_SIZE", "128"))
+    # Число партиций для ключа партиционирования category
+    num_partitions: int = int(os.getenv("MILVUS_NUM_PARTITIONS", "16"))
+    # Каталог с PCA-проекциями эмбеддингов (pca_<model>.npz); если не задан, эмбеддинги хранятся без сжатия
+    pca_dir: Optional[str] = os.getenv("MILVUS_PCA_DIR")
+    # Тип векторного поля: FLOAT_VECTOR (float32) или FLOAT16_VECTOR — вдвое меньше памяти, диска и трафика
+    vector_dtype: str = os.getenv("MILVUS_VECTOR_DTYPE", "FLOAT_VECTOR")
+
+    @property
+    def index_params(self) -> dict:
+        """Build the Milvus create_index parameters for the configured index type."""
+        if self.index_type.startswith("HNSW"):
+            params = {"M": self.hnsw_m, "efConstruction": self.hnsw_ef_construction}
+        elif "IVF" in self.index_type:
+            params = {"nlist": self.ivf_nlist}
+        elif self.index_type == "GPU_CAGRA":
+            params = {
+                "intermediate_graph_degree": self.cagra_intermediate_graph_degree,
+                "graph_degree": self.cagra_graph_degree,
+            }
+        elif self.index_type == "DISKANN":
+            params = {
+                "max_degree": self.diskann_max_degree,
+                "search_list_size": self.diskann_search_list_size,
+                "pq_code_budget_gb_ratio": self.diskann_pq_code_budget_gb_ratio,
+                "search_cache_budget_gb_ratio": self.diskann_search_cache_budget_gb_ratio,
+            }
+        else:
+            params = {}
+        return {"metric_type": self.metric_type, "index_type": self.index_type, "params": params}
+
+    @property
+    def search_params(self) -> dict:
+        """Build the Milvus search parameters for the configured index type."""
+        if self.index_type.startswith("HNSW"):
+            params = {"ef": self.hnsw_ef}
+        elif "IVF" in self.index_type:
+            params = {"nprobe": self.ivf_nprobe}
+        elif self.index_type == "DISKANN":
+            params = {"search_list": self.diskann_search_list}
+        elif self.index_type == "GPU_CAGRA":
+            params = {"itopk_size": self.cagra_itopk_size}
+        else:
+            params = {}
+        return {"metric_type": self.metric_type, "params": params}
+
 
 class DatabaseConfig(BaseSettings):
     """Settings for the database."""
@@ -24,6 +24,12 @@ class OpenAISettings(LLMProviderSettings):
     api_key: str = os.getenv("OPENAI_API_KEY")
     default_model: str = "gpt-4o"
     embedding_model: str = "text-embedding-3-small"
+    embedding_cache_url: Optional[str] = os.getenv("EMBEDDING_CACHE_URL")  # e.g. redis://localhost:6379/1
+    embedding_cache_ttl: int = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+    embedding_rpm: int = int(os.getenv("OPENAI_EMBEDDING_RPM", "3500"))
+    embedding_tpm: int = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
+    embedding_max_retries: int = 5
+    embedding_max_concurrency: int = int(os.getenv("OPENAI_EMBEDDING_MAX_CONCURRENCY", "16"))
 
 
 class AnthropicSettings(LLMProviderSettings):
@@ -47,6 +53,9 @@ class RobertaSettings(LLMProviderSettings):
 
     # embedding_model: str = "xlm-roberta-large"
     max_tokens: int = 1024
+    # Динамическая int8-квантизация Linear-слоев на CPU; отключается, если эмбеддинги расходятся с FP32
+    use_int8: bool = os.getenv("ROBERTA_USE_INT8", "false").lower() == "true"
+    int8_min_similarity: float = 0.99
 
 
 class LLMConfig(BaseSettings):
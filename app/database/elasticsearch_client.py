@@ -1,9 +1,19 @@
 from elasticsearch import AsyncElasticsearch
-from typing import Dict, List, Optional
+from elasticsearch.helpers import async_bulk
+from typing import Dict, Iterable, List, Optional, Tuple
 import os
 from functools import lru_cache
 
 
+def hnsw_profile(vector_count: int) -> Dict[str, int]:
+    """HNSW parameters (m, ef_construction, ef_search) recommended for the expected number of vectors"""
+    if vector_count < 100_000:
+        return {"m": 16, "ef_construction": 64, "ef_search": 40}
+    if vector_count < 1_000_000:
+        return {"m": 24, "ef_construction": 100, "ef_search": 100}
+    return {"m": 32, "ef_construction": 128, "ef_search": 200}
+
+
 class ElasticsearchClient:
     def __init__(self):
         # Add default values for Elasticsearch connection
@@ -11,6 +21,17 @@ class ElasticsearchClient:
 
         self.client = AsyncElasticsearch(hosts=[elasticsearch_url], basic_auth=("elastic", "your_password"))
         self.index_name = os.getenv("ELASTICSEARCH_INDEX", "events")
+        # Must match the stored embeddings (lower when they are PCA-reduced)
+        self.embedding_dims = int(os.getenv("ELASTICSEARCH_EMBEDDING_DIMS", "1536"))
+
+        # HNSW parameters: auto-configured by expected collection size, overridable individually
+        profile = hnsw_profile(int(os.getenv("ELASTICSEARCH_EXPECTED_VECTORS", "0")))
+        self.hnsw_m = int(os.getenv("ELASTICSEARCH_HNSW_M", profile["m"]))
+        self.hnsw_ef_construction = int(os.getenv("ELASTICSEARCH_HNSW_EF_CONSTRUCTION", profile["ef_construction"]))
+        self.ef_search = int(os.getenv("ELASTICSEARCH_EF_SEARCH", profile["ef_search"]))
+        # Plain hnsw works on the pinned 8.11 stack; set "int8_hnsw" on Elasticsearch 8.12+ to quantize
+        # float32 vectors to int8 at index time (4x less memory for the graph)
+        self.hnsw_type = os.getenv("ELASTICSEARCH_HNSW_TYPE", "hnsw")
 
     async def close(self):
         """Close the Elasticsearch client connection"""
@@ -28,7 +49,13 @@ class ElasticsearchClient:
                 "properties": {
                     "content": {"type": "text", "analyzer": "standard"},
                     "metadata": {"type": "object", "dynamic": True},
-                    "embedding": {"type": "dense_vector", "dims": 1536, "index": True, "similarity": "cosine"},
+                    "embedding": {
+                        "type": "dense_vector",
+                        "dims": self.embedding_dims,
+                        "index": True,
+                        "similarity": "cosine",
+                        "index_options": {"type": self.hnsw_type, "m": self.hnsw_m, "ef_construction": self.hnsw_ef_construction},
+                    },
                     "created_at": {"type": "date"},
                 }
             },
@@ -40,6 +67,15 @@ class ElasticsearchClient:
         """Index a document"""
         await self.client.index(index=self.index_name, id=doc_id, document=document, refresh=True)
 
+    async def bulk_index(self, documents: Iterable[Tuple[str, Dict]], chunk_size: int = 500) -> Tuple[int, List[Dict]]:
+        """Index (doc_id, document) pairs with the bulk API and refresh the index once at the end"""
+        actions = ({"_index": self.index_name, "_id": doc_id, "_source": document} for doc_id, document in documents)
+        success, errors = await async_bulk(
+            self.client, actions, chunk_size=chunk_size, max_chunk_bytes=10 * 1024 * 1024, raise_on_error=False
+        )
+        await self.client.indices.refresh(index=self.index_name)
+        return success, errors
+
     async def search(self, query: str, filters: Optional[Dict] = None, size: int = 10) -> List[Dict]:
         """Basic text search"""
         search_body = {"query": {"bool": {"must": [{"match": {"content": query}}]}}, "size": size}
@@ -51,16 +87,13 @@ class ElasticsearchClient:
         return results["hits"]["hits"]
 
     async def vector_search(self, vector: List[float], size: int = 10) -> List[Dict]:
-        """Vector similarity search"""
+        """Approximate kNN search over the HNSW-indexed embedding field"""
         search_body = {
-            "query": {
-                "script_score": {
-                    "query": {"match_all": {}},
-                    "script": {
-                        "source": "cosineSimilarity(params.query_vector, 'embedding') + 1.0",
-                        "params": {"query_vector": vector},
-                    },
-                }
+            "knn": {
+                "field": "embedding",
+                "query_vector": vector,
+                "k": size,
+                "num_candidates": max(size, self.ef_search),
             },
             "size": size,
         }
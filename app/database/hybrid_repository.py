@@ -40,22 +40,45 @@ class HybridSearchRepository:
         weight_vector: float = 0.7,
         size: int = 10,
         return_raw_es: bool = False,
+        fusion: str = "linear",
+        rrf_window_size: int = 100,
     ) -> List[Dict]:
         """
-        Perform hybrid search combining text and vector similarity
+        Perform hybrid search combining text and vector similarity.
+
+        The BM25 match and the native kNN clause are both evaluated by Elasticsearch,
+        so no per-document script runs. By default (fusion="linear") the scores are summed
+        using weight_text and weight_vector as boosts. fusion="rrf" opts into reciprocal
+        rank fusion, which ignores the weights and needs an Elasticsearch license tier
+        above basic.
         """
-        search_body = {
-            "query": {
-                "script_score": {
-                    "query": {"match": {"content": {"query": query}}},
-                    "script": {
-                        "source": f"(cosineSimilarity(params.query_vector, 'embedding') + 1.0) * {weight_vector} + _score * {weight_text}",
-                        "params": {"query_vector": query_vector},
-                    },
-                }
-            },
-            "size": size,
-        }
+        num_candidates = max(size, self.es_client.ef_search)
+        if fusion == "rrf":
+            search_body = {
+                "query": {"match": {"content": query}},
+                "knn": {
+                    "field": "embedding",
+                    "query_vector": query_vector,
+                    "k": max(size, rrf_window_size),
+                    "num_candidates": max(num_candidates, rrf_window_size),
+                },
+                "rank": {"rrf": {"window_size": rrf_window_size}},
+                "size": size,
+            }
+        elif fusion == "linear":
+            search_body = {
+                "query": {"match": {"content": {"query": query, "boost": weight_text}}},
+                "knn": {
+                    "field": "embedding",
+                    "query_vector": query_vector,
+                    "k": size,
+                    "num_candidates": num_candidates,
+                    "boost": weight_vector,
+                },
+                "size": size,
+            }
+        else:
+            raise ValueError(f"Unsupported fusion method: {fusion}")
 
         results = await self.es_client.client.search(index=self.es_client.index_name, body=search_body)
 
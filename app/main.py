@@ -1,8 +1,27 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from api.router import router as process_router
+from database.elasticsearch_client import get_elasticsearch_client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Per-process startup and shutdown work, kept out of the request path."""
+    es_client = get_elasticsearch_client()
+    try:
+        await es_client.init()
+    except Exception as e:
+        # Elasticsearch is optional for the RAG endpoints; don't block startup on it
+        logging.error(f"Elasticsearch index initialization failed: {e}")
+    yield
+    await es_client.close()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -0,0 +1,69 @@
+from pathlib import Path
+from typing import Sequence, Union
+
+import numpy as np
+
+"""
+Embedding Projection Module
+
+This module provides a PCA projection for reducing the dimensionality of stored
+embeddings. The projection is fitted once on a sample of embeddings, saved as an
+.npz file and applied to every embedding before it is written to or searched in
+the vector store, shrinking the index payload and distance computations.
+"""
+
+
+class PCAProjection:
+    """Linear PCA projection fitted with NumPy (mean-centering + top principal axes)."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray):
+        self.mean = np.ascontiguousarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+
+    @property
+    def n_components(self) -> int:
+        """Number of output dimensions."""
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, embeddings: Sequence[Sequence[float]], n_components: int) -> "PCAProjection":
+        """
+        Fit the projection on a sample of embeddings.
+
+        Args:
+            embeddings: Sample of embeddings, shape (n_samples, dim)
+            n_components: Number of principal components to keep
+
+        Returns:
+            PCAProjection: The fitted projection
+        """
+        x = np.asarray(embeddings, dtype=np.float32)
+        if n_components > min(x.shape):
+            raise ValueError(f"n_components={n_components} exceeds sample shape {x.shape}")
+        mean = x.mean(axis=0)
+        # Rows of vt are the principal axes ordered by explained variance
+        _, _, vt = np.linalg.svd(x - mean, full_matrices=False)
+        return cls(mean, vt[:n_components])
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "PCAProjection":
+        """Load a projection saved with save()."""
+        data = np.load(path)
+        return cls(data["mean"], data["components"])
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Save the projection as an .npz file."""
+        np.savez(path, mean=self.mean, components=self.components)
+
+    def transform(self, embeddings: Union[np.ndarray, Sequence[Sequence[float]]]) -> np.ndarray:
+        """
+        Project embeddings into the reduced space.
+
+        Args:
+            embeddings: Embeddings to project, shape (n, dim)
+
+        Returns:
+            np.ndarray: Projected float32 embeddings, shape (n, n_components)
+        """
+        x = np.asarray(embeddings, dtype=np.float32)
+        return (x - self.mean) @ self.components.T
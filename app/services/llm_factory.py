@@ -1,11 +1,22 @@
 from abc import ABC, abstractmethod
+import asyncio
+from collections import deque
+from functools import lru_cache
+import hashlib
+import json
 import logging
-from typing import Any, Dict, List, Union, Type, Tuple
+import os
+import random
+import threading
+import time
+from typing import Any, Deque, Dict, List, Optional, Union, Type, Tuple
 
+import httpx
 import instructor
+import redis
 from anthropic import Anthropic
 from config.settings import get_settings
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, APITimeoutError, AsyncOpenAI, OpenAI, RateLimitError
 from pydantic import BaseModel
 
 from transformers import AutoTokenizer, AutoModel, AutoModelForSequenceClassification
@@ -20,6 +31,116 @@ supporting structured output using Pydantic models.
 """
 
 
+@lru_cache
+def get_openai_client(api_key: Optional[str], base_url: Optional[str] = None, max_retries: int = 2) -> OpenAI:
+    """
+    Get a process-wide OpenAI client for the given credentials.
+
+    All providers share one keep-alive connection pool per endpoint instead of
+    paying a TCP + TLS handshake every time a provider is constructed.
+    max_retries=0 disables the SDK's own retries for callers that retry themselves.
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=max_retries)
+
+
+@lru_cache
+def get_async_openai_client(
+    api_key: Optional[str], base_url: Optional[str] = None, max_retries: int = 2
+) -> AsyncOpenAI:
+    """Get a process-wide AsyncOpenAI client for the given credentials."""
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=max_retries)
+
+
+def load_fast_tokenizer(name_or_path: str, **kwargs):
+    """
+    Load the Rust-backed (fast) tokenizer for a model.
+
+    Fast tokenizers encode whole batches in parallel and are much faster than the
+    Python implementations; a warning is logged if the model only ships a slow one.
+    """
+    tokenizer = AutoTokenizer.from_pretrained(name_or_path, use_fast=True, **kwargs)
+    if not tokenizer.is_fast:
+        logging.warning(f"No fast tokenizer available for {name_or_path}, falling back to the Python implementation")
+    return tokenizer
+
+
+def compile_for_inference(model: torch.nn.Module, warmup_shape: Tuple[int, int], pad_token_id: int) -> torch.nn.Module:
+    """
+    torch.compile a CUDA encoder and pay the compilation cost once on a dummy batch.
+
+    dynamic=True keeps one graph for varying batch sizes and sequence lengths instead of
+    recompiling for every new shape. The default mode is used deliberately: CUDA graphs
+    ("reduce-overhead") would record a new graph for every padded (batch, seq_len) and reuse
+    output buffers across the threads that call the model concurrently.
+    Set TORCH_COMPILE=false to run the eager model.
+    """
+    if os.getenv("TORCH_COMPILE", "true").lower() != "true":
+        return model
+
+    compiled = torch.compile(model, dynamic=True)
+    device = next(model.parameters()).device
+    input_ids = torch.full(warmup_shape, pad_token_id, dtype=torch.long, device=device)
+    with torch.inference_mode(), torch.autocast(device_type="cuda", dtype=torch.float16):
+        compiled(input_ids=input_ids, attention_mask=torch.ones_like(input_ids))
+    return compiled
+
+
+class TokenBucket:
+    """
+    Sliding-window limiter for requests per minute and tokens per minute.
+
+    acquire() blocks (aacquire() awaits) until sending a request of the given
+    size keeps both budgets within the last 60 seconds, so callers back off
+    before the API starts returning 429s.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._events: Deque[Tuple[float, int]] = deque()
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Reserve the budget and return 0, or return how long to wait before retrying."""
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            now = time.monotonic()
+            while self._events and now - self._events[0][0] >= self.WINDOW:
+                self._tokens -= self._events.popleft()[1]
+
+            if len(self._events) < self.rpm and self._tokens + tokens <= self.tpm:
+                self._events.append((now, tokens))
+                self._tokens += tokens
+                return 0.0
+
+            return max(self.WINDOW - (now - self._events[0][0]), 0.01)
+
+    def acquire(self, tokens: int) -> None:
+        while (wait := self._try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        while (wait := self._try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+@lru_cache
+def get_rate_limiter(rpm: int, tpm: int) -> TokenBucket:
+    """Get the process-wide limiter for the given budget."""
+    return TokenBucket(rpm, tpm)
+
+
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
 
@@ -38,6 +159,18 @@ class LLMProvider(ABC):
         """Get embedding vector for the given text."""
         pass
 
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embedding vectors for a batch of texts."""
+        return [self.get_embedding(text) for text in texts]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embedding vectors without blocking the event loop."""
+        return await asyncio.to_thread(self.get_embeddings, texts)
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        """Get one embedding vector without blocking the event loop."""
+        return (await self.aget_embeddings([text]))[0]
+
 
 class RobertaKazProvider(LLMProvider):
     """Roberta-Kaz-Large provider implementation using Hugging Face."""
@@ -47,10 +180,35 @@ class RobertaKazProvider(LLMProvider):
         #  self.model_path = "models/models/roberta-kaz-large"  # Local path
         self.model_path = "models/models/roberta-kaz-large"
 
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+        self.tokenizer = load_fast_tokenizer(self.model_path)
+        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path, attn_implementation="sdpa")
+        # Только инференс: без autograd-учета на каждой операции
+        self.model.eval().requires_grad_(False)
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.model.to(self.device)
+        # На GPU инференс в FP16: вдвое меньше памяти и трафика, тензорные ядра; на CPU остаемся в FP32
+        self.use_fp16 = self.device.type == "cuda"
+        if self.use_fp16:
+            self.model.half()
+            # Embeddings call the encoder directly, so the compiled module replaces model.roberta
+            self.model.roberta = compile_for_inference(self.model.roberta, (8, 512), self.tokenizer.pad_token_id)
+        elif self.settings.use_int8:
+            self.model = self._quantize_int8(self.model)
+
+    def _quantize_int8(self, model):
+        """Dynamically quantize Linear layers to int8, keeping FP32 if embeddings drift too far."""
+        quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        probe = self.tokenizer("Қазақстан Республикасының астанасы — Астана қаласы.", return_tensors="pt")
+        with torch.inference_mode():
+            reference = model.roberta(probe["input_ids"]).last_hidden_state[:, 0]
+            candidate = quantized.roberta(probe["input_ids"]).last_hidden_state[:, 0]
+        similarity = torch.nn.functional.cosine_similarity(reference, candidate).item()
+
+        if similarity < self.settings.int8_min_similarity:
+            logging.warning(f"int8 roberta embeddings diverge from FP32 (cosine {similarity:.4f}), keeping FP32")
+            return model
+        return quantized
 
     def _initialize_client(self) -> Any:
         # No client initialization needed for local models
@@ -65,9 +223,9 @@ class RobertaKazProvider(LLMProvider):
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
         # Get model output
-        with torch.no_grad():
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.use_fp16):
             outputs = self.model(**inputs)
-            logits = outputs.logits
+            logits = outputs.logits.float()
             predictions = torch.softmax(logits, dim=1)
 
         # Convert output to response model format
@@ -84,10 +242,21 @@ class RobertaKazProvider(LLMProvider):
         inputs = self.tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
-        with torch.no_grad():
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.use_fp16):
             outputs = self.model.roberta(inputs['input_ids'])
             # Use the last hidden state's CLS token as embedding
-            embeddings = outputs.last_hidden_state[:, 0, :].squeeze().cpu().numpy().tolist()
+            embeddings = outputs.last_hidden_state[:, 0, :].squeeze().float().cpu().numpy().tolist()
+
+        return embeddings
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # Single padded forward pass for the whole batch
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=512)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.use_fp16):
+            outputs = self.model.roberta(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+            embeddings = outputs.last_hidden_state[:, 0, :].float().cpu().numpy().tolist()
 
         return embeddings
 
@@ -97,16 +266,26 @@ class OpenAIProvider(LLMProvider):
 
     def __init__(self, settings):
         self.settings = settings
-        self.raw_client = OpenAI(api_key=self.settings.api_key)
+        self.raw_client = get_openai_client(self.settings.api_key)
+        # Embedding requests are retried only by _safe_openai_embeddings (_retry_delay), not by the SDK
+        self.embedding_client = get_openai_client(self.settings.api_key, max_retries=0)
+        self.async_client = get_async_openai_client(self.settings.api_key, max_retries=0)
         self.client = self._initialize_client()
+        # Bounds in-flight async embedding requests per process
+        self._async_semaphore = asyncio.Semaphore(self.settings.embedding_max_concurrency)
+
+        # Optional Redis cache for embeddings: sha256(model:text) -> vector
+        self._cache = redis.Redis.from_url(self.settings.embedding_cache_url) if self.settings.embedding_cache_url else None
+        self.cache_hits = 0
+        self.cache_misses = 0
 
         # Local HF model for fallback
-        self._hf_tokenizer = AutoTokenizer.from_pretrained(
-            "sentence-transformers/all-MiniLM-L6-v2"
-        )
+        self._hf_tokenizer = load_fast_tokenizer("sentence-transformers/all-MiniLM-L6-v2")
         self._hf_model     = AutoModel.from_pretrained(
-            "sentence-transformers/all-MiniLM-L6-v2"
+            "sentence-transformers/all-MiniLM-L6-v2", attn_implementation="sdpa"
         )
+        self._device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._hf_model.to(self._device).eval().requires_grad_(False)
 
     def _initialize_client(self) -> Any:
         return instructor.from_openai(self.raw_client)
@@ -122,37 +301,103 @@ class OpenAIProvider(LLMProvider):
         }
         return self.client.chat.completions.create_with_completion(**completion_params)
 
-    def _local_embedding(self, text: Union[str, List[str]]) -> List[List[float]]:
+    @torch.inference_mode()
+    def _local_embedding(self, text: Union[str, List[str]], batch_size: int = 64) -> List[List[float]]:
         """Generate embeddings using a local HF model."""
         texts = [text] if isinstance(text, str) else text
-        inputs = self._hf_tokenizer(
-            texts, return_tensors="pt", padding=True, truncation=True
-        )
-        with torch.no_grad():
+
+        # Texts of similar length share a batch, so padding stays close to the real lengths
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+
+        for start in range(0, len(order), batch_size):
+            idx = order[start:start + batch_size]
+            inputs = self._hf_tokenizer(
+                [texts[i] for i in idx], return_tensors="pt", padding=True, truncation=True
+            )
+            if self._device.type == "cuda":
+                # Pinned host memory allows an asynchronous host-to-device copy
+                inputs = {k: v.pin_memory().to(self._device, non_blocking=True) for k, v in inputs.items()}
             # take the [CLS] token (first token) embedding
             cls_emb = self._hf_model(**inputs).last_hidden_state[:, 0]
-        return cls_emb.tolist()
+            for i, emb in zip(idx, cls_emb.cpu().tolist()):
+                embeddings[i] = emb
+
+        return embeddings
 
     def _safe_openai_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Call OpenAI embeddings API with retry/backoff."""
-        backoff = 1
+        """
+        Call OpenAI embeddings API with client-side rate limiting and jittered exponential backoff.
+
+        Rate limits, timeouts, connection errors and 5xx responses are retried up to
+        embedding_max_retries times; the last error is re-raised after that.
+        """
+        limiter = get_rate_limiter(self.settings.embedding_rpm, self.settings.embedding_tpm)
+        estimated_tokens = sum(len(t) // 4 + 1 for t in texts)
+
+        attempt = 0
         while True:
+            limiter.acquire(estimated_tokens)
             try:
-                resp = self.raw_client.embeddings.create(
-                    model="text-embedding-3-small",
+                resp = self.embedding_client.embeddings.create(
+                    model=self.settings.embedding_model,
                     input=texts
                 )
                 return [d.embedding for d in resp.data]
-            except RateLimitError as e:
-                logging.warning(f"OpenAI rate limit hit, retrying in {backoff}s …")
-                time.sleep(backoff)
-                backoff = min(backoff * 2, 60)
-            except Exception:
-                logging.exception("Unexpected error fetching embeddings; falling back.")
-                break
+            except (RateLimitError, APITimeoutError, APIConnectionError, APIStatusError) as e:
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    async def _safe_openai_embeddings_async(self, texts: List[str]) -> List[List[float]]:
+        """Async counterpart of _safe_openai_embeddings: awaits the limiter, the request and the backoff."""
+        limiter = get_rate_limiter(self.settings.embedding_rpm, self.settings.embedding_tpm)
+        estimated_tokens = sum(len(t) // 4 + 1 for t in texts)
 
-        # If we exit the loop, fallback
-        return self._local_embedding(texts)
+        attempt = 0
+        while True:
+            await limiter.aacquire(estimated_tokens)
+            try:
+                async with self._async_semaphore:
+                    resp = await self.async_client.embeddings.create(
+                        model=self.settings.embedding_model,
+                        input=texts
+                    )
+                return [d.embedding for d in resp.data]
+            except (RateLimitError, APITimeoutError, APIConnectionError, APIStatusError) as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Jittered backoff delay for a retryable error; re-raises it when retries are exhausted."""
+        retryable = not isinstance(error, APIStatusError) or isinstance(error, RateLimitError) or error.status_code >= 500
+        if not retryable or attempt >= self.settings.embedding_max_retries:
+            raise error
+        delay = min(2 ** attempt + random.random(), 60)
+        logging.warning(f"OpenAI embeddings error ({error.__class__.__name__}), retrying in {delay:.1f}s …")
+        return delay
+
+    def _cache_key(self, text: str) -> str:
+        return "emb:" + hashlib.sha256(f"{self.settings.embedding_model}:{text}".encode("utf-8")).hexdigest()
+
+    def _cache_get(self, keys: List[str]) -> List[Optional[List[float]]]:
+        if self._cache is None or not keys:
+            return [None] * len(keys)
+        try:
+            return [json.loads(v) if v is not None else None for v in self._cache.mget(keys)]
+        except redis.RedisError as e:
+            logging.warning(f"Embedding cache unavailable: {e}")
+            return [None] * len(keys)
+
+    def _cache_set(self, items: Dict[str, List[float]]) -> None:
+        if self._cache is None or not items:
+            return
+        try:
+            with self._cache.pipeline(transaction=False) as pipe:
+                for key, embedding in items.items():
+                    pipe.set(key, json.dumps(embedding), ex=self.settings.embedding_cache_ttl)
+                pipe.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Embedding cache unavailable: {e}")
 
     def get_embedding(self, text: str) -> List[float]:
         """Get one embedding, batching under the hood."""
@@ -161,13 +406,58 @@ class OpenAIProvider(LLMProvider):
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
         Batch multiple texts in one API call (more efficient than one-by-one).
+
+        Texts already in the Redis cache are served from it; the remaining
+        texts are deduplicated and sent to OpenAI in a single request.
         """
-        # TODO: insert cache-mechanism here (e.g. check Redis/disk before API)
-        try:
-            return self._safe_openai_embeddings(texts)
-        except Exception:
-            logging.warning("Falling back to local embeddings for entire batch.")
-            return self._local_embedding(texts)
+        keys, results, missing = self._lookup_cached(texts)
+
+        if missing:
+            try:
+                fetched = dict(zip(missing, self._safe_openai_embeddings(list(missing.values()))))
+            except Exception:
+                # Cached vectors come from the OpenAI model: the whole batch falls back to the local
+                # model so that one result never mixes embeddings of different models and dimensions
+                logging.exception("Unexpected error fetching embeddings; falling back to local embeddings.")
+                return self._local_embedding(texts)
+
+            self._cache_set(fetched)
+            results = [r if r is not None else fetched[key] for key, r in zip(keys, results)]
+
+        return results
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async get_embeddings: cache misses are fetched with AsyncOpenAI without blocking the event loop."""
+        keys, results, missing = await asyncio.to_thread(self._lookup_cached, texts)
+
+        if missing:
+            try:
+                fetched = dict(zip(missing, await self._safe_openai_embeddings_async(list(missing.values()))))
+            except Exception:
+                # As in get_embeddings: never mix cached OpenAI vectors with local fallback vectors
+                logging.exception("Unexpected error fetching embeddings; falling back to local embeddings.")
+                return await asyncio.to_thread(self._local_embedding, texts)
+
+            await asyncio.to_thread(self._cache_set, fetched)
+            results = [r if r is not None else fetched[key] for key, r in zip(keys, results)]
+
+        return results
+
+    def _lookup_cached(self, texts: List[str]) -> Tuple[List[str], List[Optional[List[float]]], Dict[str, str]]:
+        """Cache keys, cached vectors (None on miss) and the unique misses in first-seen order."""
+        keys = [self._cache_key(t) for t in texts]
+        results = self._cache_get(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text, cached in zip(keys, texts, results):
+            if cached is None and key not in missing:
+                missing[key] = text
+
+        self.cache_hits += len(texts) - sum(r is None for r in results)
+        self.cache_misses += len(missing)
+        logging.debug(f"Embedding cache: {self.cache_hits} hits, {self.cache_misses} misses")
+
+        return keys, results, missing
 
 
 class AnthropicProvider(LLMProvider):
@@ -206,7 +496,7 @@ class LlamaProvider(LLMProvider):
 
     def __init__(self, settings):
         self.settings = settings
-        self.raw_client = OpenAI(base_url=self.settings.base_url, api_key=self.settings.api_key)
+        self.raw_client = get_openai_client(self.settings.api_key, self.settings.base_url)
         self.client = self._initialize_client()
 
     def _initialize_client(self) -> Any:
@@ -231,6 +521,31 @@ class LlamaProvider(LLMProvider):
         return response.data[0].embedding
 
 
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    "openai": OpenAIProvider,
+    # "anthropic": AnthropicProvider,
+    # "llama": LlamaProvider,
+    "roberta": RobertaKazProvider,
+}
+
+
+@lru_cache(maxsize=8)
+def get_provider(provider: str) -> LLMProvider:
+    """
+    Get the process-wide provider instance, loading its models and clients once.
+
+    Args:
+        provider: The name of the LLM provider
+
+    Raises:
+        ValueError: If the provider is not supported
+    """
+    provider_class = PROVIDERS.get(provider)
+    if provider_class is None:
+        raise ValueError(f"Unsupported LLM provider: {provider}")
+    return provider_class(getattr(get_settings().llm, provider))
+
+
 class LLMFactory:
     """
     Factory class for creating and managing LLM provider instances.
@@ -247,26 +562,8 @@ class LLMFactory:
 
     def __init__(self, provider: str):
         self.provider = provider
-        settings = get_settings()
-        self.settings = getattr(settings.llm, provider)
-        self.llm_provider = self._create_provider()
-        self.model_path = "models/models/roberta-kaz-large"
-        
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-        self.model = AutoModel.from_pretrained(self.model_path)
-        self.llm_provider = self._create_provider()
-
-    def _create_provider(self) -> LLMProvider:
-        providers = {
-            "openai": OpenAIProvider,
-            # "anthropic": AnthropicProvider,
-            # "llama": LlamaProvider,
-            "roberta": RobertaKazProvider,
-        }
-        provider_class = providers.get(self.provider)
-        if provider_class:
-            return provider_class(self.settings)
-        raise ValueError(f"Unsupported LLM provider: {self.provider}")
+        self.settings = getattr(get_settings().llm, provider)
+        self.llm_provider = get_provider(provider)
 
     def create_completion(self, response_model: Type[BaseModel], messages: List[Dict[str, str]], **kwargs) -> Tuple[BaseModel, Any]:
         """
@@ -303,3 +600,26 @@ class LLMFactory:
             NotImplementedError: If the provider doesn't support embeddings
         """
         return self.llm_provider.get_embedding(text)
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embedding vectors for a batch of texts in as few provider calls as possible.
+
+        Args:
+            texts: The texts to get embeddings for
+
+        Returns:
+            List of embedding vectors, in the same order as the input texts
+
+        Raises:
+            NotImplementedError: If the provider doesn't support embeddings
+        """
+        return self.llm_provider.get_embeddings(texts)
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        """Async variant of get_embedding that does not block the event loop."""
+        return await self.llm_provider.aget_embedding(text)
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async variant of get_embeddings that does not block the event loop."""
+        return await self.llm_provider.aget_embeddings(texts)
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from pymilvus import connections
+
+from config.settings import get_settings
+
+"""
+Milvus Connection Module
+
+This module owns the process-wide Milvus connection. pymilvus keeps one gRPC
+channel per alias, so every store, script and utility that goes through
+get_connection() shares the same channel instead of opening a new one.
+"""
+
+
+def get_connection(alias: Optional[str] = None) -> str:
+    """
+    Connect to Milvus once per alias and return the alias to pass as `using=`.
+
+    Args:
+        alias: Connection alias; defaults to the configured Milvus database name
+
+    Returns:
+        str: The alias of the established connection
+    """
+    settings = get_settings().database
+    alias = alias or settings.name
+    if not connections.has_connection(alias):
+        connections.connect(
+            alias=alias,
+            host=settings.host,
+            port=settings.port,
+            db_name=settings.name
+        )
+    return alias
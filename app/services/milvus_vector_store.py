@@ -1,12 +1,18 @@
+import asyncio
+import json
 import logging
+import os
 from transformers import AutoTokenizer, AutoModel
 import torch
-from typing import Any, List, Optional, Tuple, Union
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from pymilvus import connections, utility
 from pymilvus import FieldSchema, DataType, CollectionSchema, Collection, Connections
 from config.settings import get_settings
+import numpy as np
 import pandas as pd
 from services.llm_factory import LLMFactory
+from services.embedding_projection import PCAProjection
+from services.milvus_pool import get_connection
 from openai import OpenAI
 from utils.timer import timer
 
@@ -17,6 +23,8 @@ from typing import List, Union, Dict, Any, Type
 
 
 class MilvusVectorStore:
+    DELETE_BATCH_SIZE = 1000
+
     def __init__(self, embedding_model: str = None):
         """
         Initialize the VectorStore with settings, OpenAI client, and Milvus connection.
@@ -37,26 +45,38 @@ class MilvusVectorStore:
             self.embedding_dim = self.roberta_settings.max_tokens
         else:
             raise ValueError(f"Unknown embedding model dimension for {embedding_model!r}")
-            
-        
- 
+
+        # PCA-проекция уменьшает размерность хранимых эмбеддингов, если она обучена для модели
+        self.projection = None
+        if self.vector_settings.pca_dir:
+            pca_path = os.path.join(self.vector_settings.pca_dir, f"pca_{embedding_model}.npz")
+            if os.path.exists(pca_path):
+                self.projection = PCAProjection.load(pca_path)
+                self.embedding_dim = self.projection.n_components
+
+        # Один провайдер эмбеддингов на хранилище: модели и HTTP-клиент создаются один раз
+        self._llm = LLMFactory("roberta" if embedding_model == "roberta" else "openai")
+
         # Обновляем размерность в настройках для создания коллекции
         self.vector_settings.embedding_dimensions = self.embedding_dim
 
         self.settings = get_settings()
         settings = get_settings().database
-        connections.connect(
-            alias=settings.name,
-            host=settings.host,
-            port=settings.port,
-            db_name=settings.name)
+        # Все экземпляры используют одно gRPC-соединение на alias
+        get_connection(settings.name)
 
         self.collection_name = f"{self.settings.database.name}_{embedding_model}"
+        logging.info(
+            f"Milvus collection {self.collection_name}: "
+            f"index={self.vector_settings.index_params}, search={self.vector_settings.search_params}"
+        )
 
         self._collection = None
         if utility.has_collection(self.collection_name, using=settings.name):
             self._collection = Collection(name=self.collection_name, using=settings.name)
-            self._collection.load()
+            # Коллекция без индекса (отложенная индексация) загружается после первой вставки
+            if self._collection.has_index():
+                self._collection.load()
         else:
             self.create_tables()
             self.create_index()
@@ -82,18 +102,85 @@ class MilvusVectorStore:
         Returns:
             List[float]: Vector embedding representation of the input text
         """
+        return self._embed_query(text).tolist()
+
+    def _embed_query(self, text: str) -> np.ndarray:
         text = text.replace("\n", " ")
-        
-        if self.embedding_model == "roberta":
-            llm = LLMFactory("roberta")
-        else:  # openai
-            llm = LLMFactory("openai")
 
         with timer("Embedding generation"):
-            embeddings = llm.get_embedding(text)
+            embedding = self._llm.get_embedding(text)
+
+        return self._prepare_embeddings([embedding])[0]
+
+    def _prepare_embeddings(self, embeddings: List[List[float]]) -> np.ndarray:
+        """
+        Apply the PCA projection (if fitted) and, for the IP metric, L2-normalize the embeddings
+        so that inner product on stored and query vectors equals cosine similarity.
+
+        Returns:
+            np.ndarray: float32 embeddings of shape (n, embedding_dim)
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.projection is not None:
+            vectors = self.projection.transform(vectors)
+        return self._unit_norm(vectors)
+
+    def _unit_norm(self, vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize float32 vectors for the IP metric, so that inner product equals cosine similarity."""
+        if self.vector_settings.metric_type != "IP":
+            return vectors
+        return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+    def _to_storage(self, vectors: np.ndarray) -> np.ndarray:
+        """Cast prepared float32 vectors to the dtype of the collection's vector field."""
+        if self.vector_settings.vector_dtype == "FLOAT16_VECTOR":
+            return vectors.astype(np.float16)
+        return vectors
+
+    def get_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """
+        Generate embeddings for a batch of texts with a single call to the selected embedding model.
+
+        Args:
+            texts (List[str]): Texts to generate embeddings for
+            batch_size (int, optional): Split the texts into model calls of this size (default: one call)
+
+        Returns:
+            List[List[float]]: Vector embeddings in the same order as the input texts
+        """
+        return self.get_embeddings_array(texts, batch_size).tolist()
+
+    def get_embeddings_array(self, texts: List[str], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Same as get_embeddings, but returns one contiguous float32 array of shape (len(texts), embedding_dim),
+        filled batch by batch, ready to be inserted without per-float Python boxing.
+        """
+        texts = [text.replace("\n", " ") for text in texts]
+        batch_size = batch_size or max(len(texts), 1)
+        embeddings = np.empty((len(texts), self.embedding_dim), dtype=np.float32)
+
+        with timer("Batch embedding generation"):
+            for i in range(0, len(texts), batch_size):
+                embeddings[i:i + batch_size] = self._prepare_embeddings(self._llm.get_embeddings(texts[i:i + batch_size]))
 
         return embeddings
 
+    async def aget_embedding(self, text: str) -> List[float]:
+        """
+        Async variant of get_embedding: the embedding request does not block the event loop.
+
+        Args:
+            text (str): Text to generate embeddings for
+
+        Returns:
+            List[float]: Vector embedding representation of the input text
+        """
+        return (await self._aembed_query(text)).tolist()
+
+    async def _aembed_query(self, text: str) -> np.ndarray:
+        embedding = await self._llm.aget_embedding(text.replace("\n", " "))
+        return self._prepare_embeddings([embedding])[0]
+
     def create_tables(self) -> None:
         """
         Create collection schema and initialize the collection in Milvus.
@@ -102,10 +189,12 @@ class MilvusVectorStore:
         print(f"[DEBUG] → collection={self.collection_name}, embedding_model={self.embedding_model}, embedding_dim={self.embedding_dim}")
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=360, is_primary=True),
-            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100),
+            # Ключ партиционирования: Milvus раскладывает записи по партициям по хэшу категории
+            # и при фильтре по category ищет только в нужных партициях
+            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100, is_partition_key=True),
             FieldSchema(name="created_at", dtype=DataType.VARCHAR, max_length=250),
             FieldSchema(name="contents", dtype=DataType.VARCHAR, max_length=60535),
-            FieldSchema(name=self.vector_settings.table_name, dtype=DataType.FLOAT_VECTOR,
+            FieldSchema(name=self.vector_settings.table_name, dtype=DataType[self.vector_settings.vector_dtype],
                         dim=self.embedding_dim)
         ]
 
@@ -113,6 +202,7 @@ class MilvusVectorStore:
         self._collection = Collection(
             name=self.collection_name,
             schema=schema,
+            num_partitions=self.vector_settings.num_partitions,
             using=self.collection_name
         )
 
@@ -133,19 +223,11 @@ class MilvusVectorStore:
     def create_index(self) -> None:
         """
         Create a vector index on the embedding field to optimize vector similarity search.
-        Uses DISKANN index type with IP (Inner Product) metric for similarity calculation.
+        Index type, metric and build parameters come from VectorStoreConfig.
         """
-        index_params = {
-            "metric_type": "IP",
-            "index_type": "DISKANN",
-            "params": {
-                "search_list": 100
-            }
-        }
-
         self._collection.create_index(
             field_name=self.vector_settings.table_name,
-            index_params=index_params
+            index_params=self.vector_settings.index_params
         )
 
     def drop_index(self) -> None:
@@ -161,13 +243,69 @@ class MilvusVectorStore:
         Args:
             df (pd.DataFrame): DataFrame containing the data to insert
         """
-        print(df)
-        self._collection.insert(data=df)
+        self.insert_many([df])
+
+    def insert_many(self, dfs: Iterable[pd.DataFrame], compact: bool = False) -> None:
+        """
+        Insert several DataFrames with a single flush at the end.
+        The index is built only if the collection doesn't have one yet; Milvus indexes
+        new segments of an indexed collection in the background.
+
+        Args:
+            dfs (Iterable[pd.DataFrame]): DataFrames containing the data to insert
+            compact (bool): Merge small segments before building the index (for bulk loads)
+        """
+        rows = 0
+        for df in dfs:
+            self._collection.insert(data=self._normalize_vectors(df))
+            rows += len(df)
+        self._finish_insert(rows, compact)
+
+    def insert_columns(self, columns: Dict[str, Any], batch_size: int = 5000, compact: bool = False) -> None:
+        """
+        Insert column-oriented data (one sequence per schema field) without building a DataFrame.
+        The embedding column may be a float32 array of shape (n, dim); it is sent to Milvus in slices.
+
+        Args:
+            columns (Dict[str, Any]): Field name -> column values, all of the same length
+            batch_size (int): Rows per insert request
+            compact (bool): Merge small segments before building the index (for bulk loads)
+        """
+        vector_field = self.vector_settings.table_name
+        vectors = self._to_storage(self._unit_norm(np.asarray(columns[vector_field], dtype=np.float32)))
+        columns = {**columns, vector_field: vectors}
+        # Auto-id and dynamic ($meta) fields are filled by Milvus, not passed in the column list
+        names = [
+            field.name for field in self._collection.schema.fields
+            if not field.auto_id and not field.is_dynamic
+        ]
+        rows = len(columns[vector_field])
+
+        for i in range(0, rows, batch_size):
+            self._collection.insert(data=[columns[name][i:i + batch_size] for name in names])
+        self._finish_insert(rows, compact)
+
+    def _finish_insert(self, rows: int, compact: bool) -> None:
         self._collection.flush()
-        self.create_index()
-        print("✅ Данные загружены и записаны в Milvus!")
-        self._collection.load()
-        print("✅ Коллекция загружена в память!")
+        if compact:
+            self._collection.compact()
+            self._collection.wait_for_compaction_completed()
+        self._ensure_index()
+        logging.info(f"Загружено {rows} записей в {self.collection_name}")
+
+    def _ensure_index(self) -> None:
+        """Build the vector index and load the collection only when it has no index yet."""
+        if not self._collection.has_index():
+            self.create_index()
+            self._collection.load()
+
+    def _normalize_vectors(self, df: pd.DataFrame) -> pd.DataFrame:
+        """L2-normalize the embedding column for the IP metric and cast it to the stored vector dtype."""
+        column = self.vector_settings.table_name
+        if column not in df or df.empty:
+            return df
+        vectors = self._to_storage(self._unit_norm(np.asarray(df[column].tolist(), dtype=np.float32)))
+        return df.assign(**{column: list(vectors)})
 
     def upsert(self, df: pd.DataFrame) -> None:
         """
@@ -177,10 +315,9 @@ class MilvusVectorStore:
         Args:
             df (pd.DataFrame): DataFrame containing the data to insert or update
         """
-        self._collection.upsert(data=df)
+        self._collection.upsert(data=self._normalize_vectors(df))
         self._collection.flush()
-        self.create_index()
-        self._collection.load()
+        self._ensure_index()
 
     def delete(
             self,
@@ -206,8 +343,10 @@ class MilvusVectorStore:
             return
 
         if ids:
-            expr = f"id in {ids}"
-            self._collection.delete(expr)
+            # Ограничиваем размер выражения: одно удаление на пачку ID и один flush в конце
+            for i in range(0, len(ids), self.DELETE_BATCH_SIZE):
+                self._collection.delete(f"id in {ids[i:i + self.DELETE_BATCH_SIZE]}")
+            self._collection.flush()
             logging.info(f"Удалено {len(ids)} записей")
             return
 
@@ -226,7 +365,12 @@ class MilvusVectorStore:
 
         raise ValueError("Необходимо указать ids, metadata_filter или delete_all=True")
 
-    def search(self, query: str, top_k: int = 5) -> pd.DataFrame:
+    def search(
+            self,
+            query: str,
+            top_k: int = 5,
+            categories: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
         """
         Perform semantic vector search using the query text.
         First generates an embedding for the query, then searches for similar vectors in the collection.
@@ -234,20 +378,51 @@ class MilvusVectorStore:
         Args:
             query (str): Search query text
             top_k (int): Number of top results to return
+            categories (List[str], optional): Restrict the search to these categories (only their partitions are scanned)
+
+        Returns:
+            pd.DataFrame: DataFrame with search results including ID, category, contents and distance metrics
+        """
+        return self._search_by_vector(self._embed_query(query), top_k, categories)
+
+    async def asearch(
+            self,
+            query: str,
+            top_k: int = 5,
+            categories: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Async variant of search: awaits the query embedding and runs the blocking
+        Milvus call in a worker thread, so concurrent requests overlap their I/O.
+
+        Args:
+            query (str): Search query text
+            top_k (int): Number of top results to return
+            categories (List[str], optional): Restrict the search to these categories
 
         Returns:
             pd.DataFrame: DataFrame with search results including ID, category, contents and distance metrics
         """
+        query_embd = await self._aembed_query(query)
+        return await asyncio.to_thread(self._search_by_vector, query_embd, top_k, categories)
+
+    def _search_by_vector(
+            self,
+            query_embd: np.ndarray,
+            top_k: int,
+            categories: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
         search_results = []
-        query_embd = self.get_embedding(query)
+        expr = f"category in {json.dumps(categories, ensure_ascii=False)}" if categories else None
 
         with timer("Vector search"):
 
             results = self._collection.search(
-                data=[query_embd],
+                data=[self._to_storage(query_embd)],
                 anns_field=self.vector_settings.table_name,
-                param={"metric_type": "IP", "params": {"search_list": 100}},
+                param=self.vector_settings.search_params,
                 limit=top_k,
+                expr=expr,
                 output_fields=["id", "category", "contents", "created_at"]
             )
         for result in results:
@@ -1,10 +1,19 @@
+import logging
+import os
 import torch
 from abc import ABC, abstractmethod
-from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from transformers import AutoModelForSequenceClassification
 from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
 import numpy as np
 
+from services.llm_factory import compile_for_inference, load_fast_tokenizer
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 
 class Reranker(ABC):
     def __call__(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5) -> List[Dict[str, Any]]:
@@ -47,27 +56,93 @@ class RerankerRoberta(Reranker):
     """
     Класс для переранжирования результатов поиска с помощью модели roberta-reranker-kaz.
     """
-    def __init__(self, device: Optional[str] = None):
+    def __init__(self, device: Optional[str] = None, onnx_path: Optional[str] = None):
         """
         Инициализация реранкера.
 
         Args:
             model_name: Название модели для реранкинга
             device: Устройство для вычислений ('cuda', 'cpu' или None для автоматического выбора)
+            onnx_path: Путь к ONNX-модели для инференса через ONNX Runtime
+                (по умолчанию RERANKER_ONNX_PATH; если не задан — PyTorch)
         """
         self.model_name = "nur-dev/roberta-reranker-kaz"
-        self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        self.device = torch.device(device or ('cuda' if torch.cuda.is_available() else 'cpu'))
+        self.onnx_path = onnx_path or os.getenv("RERANKER_ONNX_PATH")
         self.tokenizer = None
         self.model = None
+        self.session = None
+        self.use_fp16 = False
         self.token = None
         self._load_model()
 
     def _load_model(self):
         """Загрузка модели и токенизатора."""
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name, token=self.token)
-        self.model = AutoModelForSequenceClassification.from_pretrained(self.model_name, token=self.token)
-        self.model.eval()
+        self.tokenizer = load_fast_tokenizer(self.model_name, token=self.token)
+        # SDPA: слитое ядро внимания PyTorch (FlashAttention на Ampere+) вместо поэлементной реализации
+        self.model = AutoModelForSequenceClassification.from_pretrained(
+            self.model_name, token=self.token, attn_implementation="sdpa"
+        )
+        self.model.eval().requires_grad_(False)
+
+        if self.onnx_path:
+            self.session = self._load_onnx_session()
+            if self.session is not None:
+                return
+
         self.model.to(self.device)
+        # На GPU инференс в FP16, на CPU остаемся в FP32
+        self.use_fp16 = self.device.type == 'cuda'
+        if self.use_fp16:
+            self.model.half()
+            self.model = compile_for_inference(self.model, (8, 512), self.tokenizer.pad_token_id)
+
+    def _load_onnx_session(self):
+        """
+        Экспорт модели в ONNX (при первом запуске) и создание сессии ONNX Runtime.
+        Возвращает None, если onnxruntime не установлен или экспорт не удался.
+        """
+        if ort is None:
+            logging.warning("onnxruntime не установлен, реранкер работает через PyTorch")
+            return None
+
+        try:
+            if not os.path.exists(self.onnx_path):
+                dummy = self.tokenizer(["запрос"], ["документ"], return_tensors="pt")
+                torch.onnx.export(
+                    self.model,
+                    (dummy["input_ids"], dummy["attention_mask"]),
+                    self.onnx_path,
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["logits"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "logits": {0: "batch"},
+                    },
+                    opset_version=17,
+                )
+
+            providers = ["CPUExecutionProvider"]
+            if self.device.type == 'cuda' and "CUDAExecutionProvider" in ort.get_available_providers():
+                providers.insert(0, "CUDAExecutionProvider")
+            return ort.InferenceSession(self.onnx_path, providers=providers)
+        except Exception as e:
+            logging.error(f"Не удалось загрузить ONNX-модель реранкера {self.onnx_path}: {e}")
+            return None
+
+    def _score_batch(self, batch: Dict[str, torch.Tensor]) -> np.ndarray:
+        """Оценки релевантности для одного батча пар запрос-документ."""
+        if self.session is not None:
+            logits = self.session.run(None, {
+                "input_ids": batch["input_ids"].numpy(),
+                "attention_mask": batch["attention_mask"].numpy(),
+            })[0]
+            return logits[:, 0]
+
+        batch = {k: v.to(self.device) for k, v in batch.items()}
+        outputs = self.model(**batch)
+        return outputs.logits[:, 0].float().cpu().numpy()
 
     def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5,
                batch_size: int = 8) -> List[Dict[str, Any]]:
@@ -86,42 +161,40 @@ class RerankerRoberta(Reranker):
         if not documents:
             return []
 
-        # Подготовка пар запрос-документ для оценки
-        pairs = [(query, doc["contents"]) for doc in documents]
-
-        # Токенизация и получение оценок
-        scores = []
+        # Запрос общий для всех пар, поэтому одинаковые тексты (дубли чанков под разными ID) оцениваются один раз
+        doc_texts = list(dict.fromkeys(doc["contents"] for doc in documents))
 
-        for i in range(0, len(pairs), batch_size):
-            batch_pairs = pairs[i:i + batch_size]
+        # Токенизация всех уникальных пар запрос-документ одним вызовом, без паддинга
+        features = self.tokenizer(
+            [query] * len(doc_texts),
+            doc_texts,
+            truncation=True,
+            max_length=512
+        )
+        features = [{k: v[i] for k, v in features.items()} for i in range(len(doc_texts))]
 
-            # Токенизация
-            encoded = self.tokenizer(
-                batch_pairs,
-                padding=True,
-                truncation=True,
-                max_length=512,
-                return_tensors="pt"
-            )
+        # Пары близкой длины попадают в один батч, поэтому паддинг почти не добавляет лишних токенов
+        order = np.argsort([len(f["input_ids"]) for f in features], kind="stable")
+        scores = np.empty(len(doc_texts), dtype=np.float32)
 
-            # Перенос на нужное устройство
-            encoded = {k: v.to(self.device) for k, v in encoded.items()}
-
-            # Получение оценок
-            with torch.no_grad():
-                outputs = self.model(**encoded)
-                batch_scores = outputs.logits.squeeze(-1).cpu().numpy()
-                scores.extend(batch_scores)
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.float16, enabled=self.use_fp16):
+            for i in range(0, len(order), batch_size):
+                idx = order[i:i + batch_size]
+                batch = self.tokenizer.pad([features[j] for j in idx], return_tensors="pt")
+                scores[idx] = self._score_batch(batch)
 
         # Добавление оценок к документам и сортировка
+        text_scores = dict(zip(doc_texts, scores.tolist()))
+        doc_scores = np.empty(len(documents), dtype=np.float32)
         for i, doc in enumerate(documents):
-            doc["rerank_score"] = float(scores[i])
+            doc["rerank_score"] = doc_scores[i] = text_scores[doc["contents"]]
 
-        # Сортировка по оценке reranking
-        reranked_docs = sorted(documents, key=lambda x: x["rerank_score"], reverse=True)
+        # Отбор top-k без полной сортировки: argpartition за O(n), затем сортируются только k лучших
+        k = min(top_k, len(documents))
+        top = np.argpartition(-doc_scores, k - 1)[:k]
+        top = top[np.argsort(-doc_scores[top], kind="stable")]
 
-        # Возврат top-k результатов
-        return reranked_docs[:top_k]
+        return [documents[i] for i in top]
 
 class RerankerLaBSE(Reranker):
     def __init__(self, device: Optional[str] = None):
@@ -133,21 +206,18 @@ class RerankerLaBSE(Reranker):
     def _load_model(self):
         self.model = SentenceTransformer('sentence-transformers/LaBSE')
     
-    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5, batch_size: int = 8) -> List[Dict[str, Any]]:
+    def rerank(self, query: str, documents: List[Dict[str, Any]], top_k: int = 5, batch_size: int = 64) -> List[Dict[str, Any]]:
         if not documents:
             return []
 
         doc_texts = [doc["contents"] for doc in documents]
-        query_emb = self.model.encode(query, convert_to_tensor=True)
-        doc_embs = self.model.encode(doc_texts, convert_to_tensor=True, batch_size=batch_size)
-        cos_scores = util.cos_sim(query_emb, doc_embs)[0]
-        reranked = []
-
-        for score, doc in zip(cos_scores.tolist(), documents):
-            doc_copy = dict(doc)
-            doc_copy["rerank_score"] = score
-            reranked.append(doc_copy)
+        # Нормализованные эмбеддинги: косинусное сходство сводится к одному матрично-векторному произведению (BLAS)
+        query_emb = self.model.encode(query, convert_to_tensor=True, normalize_embeddings=True)
+        doc_embs = self.model.encode(doc_texts, convert_to_tensor=True, batch_size=batch_size,
+                                     normalize_embeddings=True, show_progress_bar=False)
+        cos_scores = doc_embs @ query_emb
 
-        reranked = sorted(reranked, key=lambda x: x["rerank_score"], reverse=True)
+        # Отбор top-k на устройстве: копируются и переносятся на CPU только k документов
+        values, indices = torch.topk(cos_scores, min(top_k, len(documents)))
 
-        return reranked[:top_k]
\ No newline at end of file
+        return [{**documents[i], "rerank_score": score} for i, score in zip(indices.tolist(), values.tolist())]
\ No newline at end of file
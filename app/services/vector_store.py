@@ -6,7 +6,7 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from config.settings import get_settings
-from openai import OpenAI
+from services.llm_factory import get_openai_client
 from timescale_vector import client
 from utils.timer import timer
 
@@ -33,7 +33,7 @@ class VectorStore:
             local (bool): If True, overrides .env to use localhost DB for running outside Docker.
         """
         self.settings = get_settings()
-        self.openai_client = OpenAI(api_key=self.settings.llm.openai.api_key)
+        self.openai_client = get_openai_client(self.settings.llm.openai.api_key)
         self.embedding_model = self.settings.llm.openai.embedding_model
         self.vector_settings = self.settings.database.vector_store
         self.settings.database.local = local
@@ -82,6 +82,28 @@ class VectorStore:
             )
         return embedding
 
+    def get_embeddings(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        """
+        Generate embeddings for many texts with one API request per batch.
+
+        Args:
+            texts: The input texts to generate embeddings for.
+            batch_size: Number of texts sent in a single embeddings request.
+
+        Returns:
+            A list of embeddings in the same order as the input texts.
+        """
+        texts = [text.replace("\n", " ") for text in texts]
+        embeddings = []
+        with timer("Batch embedding generation"):
+            for i in range(0, len(texts), batch_size):
+                response = self.openai_client.embeddings.create(
+                    input=texts[i:i + batch_size],
+                    model=self.embedding_model,
+                )
+                embeddings.extend(d.embedding for d in response.data)
+        return embeddings
+
     def create_tables(self) -> None:
         """Create the necessary tablesin the database"""
         self.vec_client.create_tables()
@@ -1,4 +1,6 @@
 from contextlib import contextmanager
+from typing import Optional
+from uuid import UUID
 
 from api.dependencies import db_session
 from api.event_schema import EventSchema
@@ -17,24 +19,30 @@ pipeline execution and result storage.
 
 
 @celery_app.task(name="process_incoming_event")
-def process_incoming_event(event_id: str):
+def process_incoming_event(event_id: str, data: Optional[dict] = None):
     """Processes an incoming event through its designated pipeline.
 
     This Celery task handles the asynchronous processing of events by:
-    1. Retrieving the event from the database
+    1. Storing the event in the database (when its data is passed in)
+       or retrieving the previously stored event
     2. Determining the appropriate pipeline
     3. Executing the pipeline
     4. Storing the results
 
     Args:
         event_id: Unique identifier of the event to process
+        data: Raw event data as received by the API; if omitted the event
+            must already exist in the database
     """
     with contextmanager(db_session)() as session:
         # Initialize repository for database operations
         repository = GenericRepository(session=session, model=Event)
 
-        # Retrieve event from database
-        db_event = repository.get(id=event_id)
+        # Store the event submitted by the API, or retrieve it from database
+        if data is not None:
+            db_event = repository.create(obj=Event(id=UUID(event_id), data=data))
+        else:
+            db_event = repository.get(id=event_id)
         if db_event is None:
             raise ValueError(f"Event with id {event_id} not found")
 
@@ -1,31 +1,56 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from typing import Iterator, List, Optional
+
 import fitz  # PyMuPDF
 from docx import Document
 
+# Меньшие PDF быстрее читать последовательно, чем запускать процессы
+PDF_PARALLEL_MIN_PAGES = 64
+PDF_MAX_WORKERS = 8
+
 
-def read_txt(file_bytes: bytes) -> str:
-    return file_bytes.decode("utf-8")
+def read_txt(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
 
 
-def read_docx(file_bytes: bytes) -> str:
-    from io import BytesIO
-    doc = Document(BytesIO(file_bytes))
+def read_docx(path: str) -> str:
+    doc = Document(path)
     return "\n".join([p.text for p in doc.paragraphs])
 
 
-def read_pdf(file_bytes: bytes) -> str:
-    from io import BytesIO
-    text = ""
-    with fitz.open(stream=BytesIO(file_bytes), filetype="pdf") as pdf:
+def iter_pdf_pages(path: str) -> Iterator[str]:
+    with fitz.open(path, filetype="pdf") as pdf:
         for page in pdf:
-            text += page.get_text()
-    return text
+            yield page.get_text()
+
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    with fitz.open(path, filetype="pdf") as pdf:
+        return [pdf[i].get_text() for i in range(start, stop)]
+
+
+def read_pdf(path: str, max_workers: Optional[int] = None) -> str:
+    with fitz.open(path, filetype="pdf") as pdf:
+        page_count = pdf.page_count
+
+    workers = min(max_workers or os.cpu_count() or 1, PDF_MAX_WORKERS, page_count // PDF_PARALLEL_MIN_PAGES)
+    if workers <= 1:
+        return "".join(iter_pdf_pages(path))
+
+    # MuPDF не потокобезопасен, поэтому диапазоны страниц разбираются в отдельных процессах,
+    # каждый со своим документом
+    bounds = [page_count * i // workers for i in range(workers + 1)]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        parts = executor.map(_extract_pdf_pages, [path] * workers, bounds[:-1], bounds[1:])
+        return "".join(chain.from_iterable(parts))
 
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 50) -> list[str]:
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + chunk_size, len(text))
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
+    step = chunk_size - overlap
+    if step <= 0:
+        raise ValueError("overlap must be smaller than chunk_size")
+    return [text[start:start + chunk_size] for start in range(0, len(text), step)]
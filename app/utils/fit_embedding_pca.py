@@ -0,0 +1,69 @@
+"""
+Скрипт для обучения PCA-проекции эмбеддингов, уже сохраненных в Milvus.
+Проекция сохраняется в MILVUS_PCA_DIR/pca_<model>.npz и применяется MilvusVectorStore
+ко всем новым эмбеддингам. После обучения коллекцию нужно пересоздать
+(init_mivus_collection.py --force) и загрузить документы заново.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+app_root = Path(__file__).parent.parent
+sys.path.append(str(app_root))
+
+import numpy as np
+from pymilvus import Collection
+
+from config.settings import get_settings
+from services.embedding_projection import PCAProjection
+from services.milvus_pool import get_connection
+
+
+def to_float32(vector) -> np.ndarray:
+    """
+    Привести эмбеддинг из результата запроса к float32.
+    Поля FLOAT16_VECTOR возвращаются запросом как сырые байты.
+    """
+    if isinstance(vector, list) and vector and isinstance(vector[0], bytes):
+        vector = vector[0]
+    if isinstance(vector, bytes):
+        return np.frombuffer(vector, dtype=np.float16).astype(np.float32)
+    return np.asarray(vector, dtype=np.float32)
+
+
+def main():
+    """
+    Основная функция скрипта.
+    """
+    parser = argparse.ArgumentParser(description="Обучение PCA-проекции эмбеддингов Milvus")
+    parser.add_argument("--model", choices=["roberta", "openai"], default="openai", help="Модель эмбеддингов")
+    parser.add_argument("--components", type=int, default=384, help="Размерность после проекции")
+    parser.add_argument("--sample", type=int, default=10000, help="Количество эмбеддингов для обучения")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    vector_settings = settings.database.vector_store
+    if not vector_settings.pca_dir:
+        print("Не задана переменная окружения MILVUS_PCA_DIR")
+        return
+
+    alias = get_connection(settings.database.name)
+    collection = Collection(name=f"{settings.database.name}_{args.model}", using=alias)
+    collection.load()
+
+    rows = collection.query(expr="id != ''", output_fields=[vector_settings.table_name], limit=args.sample)
+    embeddings = [to_float32(row[vector_settings.table_name]) for row in rows]
+    print(f"Получено {len(embeddings)} эмбеддингов для обучения")
+
+    projection = PCAProjection.fit(embeddings, n_components=args.components)
+
+    os.makedirs(vector_settings.pca_dir, exist_ok=True)
+    path = os.path.join(vector_settings.pca_dir, f"pca_{args.model}.npz")
+    projection.save(path)
+    print(f"PCA-проекция ({args.components} компонент) сохранена: {path}")
+
+
+if __name__ == "__main__":
+    main()
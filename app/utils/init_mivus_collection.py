@@ -1,9 +1,11 @@
 """
 Скрипт для инициализации коллекций Milvus для разных моделей эмбеддингов.
-Создает отдельные коллекции для RoBERTa и OpenAI, а также создает индексы для оптимизации поиска.
+Создает отдельные коллекции для RoBERTa и OpenAI. По умолчанию индекс не создается: его строит
+MilvusVectorStore после первой пакетной загрузки, что быстрее инкрементальной индексации пустой коллекции.
 """
 
 import argparse
+import os
 from typing import List, Optional
 import sys
 from pathlib import Path
@@ -12,11 +14,13 @@ import time
 app_root = Path(__file__).parent.parent
 sys.path.append(str(app_root))
 
-from pymilvus import connections, utility
+from pymilvus import utility
 from pymilvus import FieldSchema, DataType, CollectionSchema, Collection
 
 from config.settings import get_settings
 from services.milvus_vector_store import MilvusVectorStore
+from services.embedding_projection import PCAProjection
+from services.milvus_pool import get_connection
 
 def connect_to_milvus(settings) -> bool:
     """
@@ -29,13 +33,8 @@ def connect_to_milvus(settings) -> bool:
         bool: True, если подключение установлено успешно, иначе False
     """
     try:
-        # Подключаемся к Milvus с указанием базы данных
-        connections.connect(
-            alias=settings.database.name,
-            host=settings.database.host,
-            port=settings.database.port,
-            db_name=settings.database.name
-        )
+        # Подключаемся к Milvus с указанием базы данных (соединение переиспользуется, если уже открыто)
+        get_connection(settings.database.name)
         return True
     except Exception as e:
         print(f"Ошибка подключения к Milvus: {e}")
@@ -60,13 +59,14 @@ def list_collections(settings) -> List[str]:
         return []
 
 
-def create_collection(settings, embedding_model: str) -> Optional[Collection]:
+def create_collection(settings, embedding_model: str, defer_index: bool = True) -> Optional[Collection]:
     """
     Создает коллекцию для указанной модели эмбеддингов.
     
     Args:
         settings: Настройки приложения
         embedding_model: Модель эмбеддингов ("roberta" или "openai")
+        defer_index: Если True, индекс создается после загрузки данных, а не сейчас
         
     Returns:
         Optional[Collection]: Созданная коллекция или None в случае ошибки
@@ -79,6 +79,11 @@ def create_collection(settings, embedding_model: str) -> Optional[Collection]:
             embedding_dim = settings.llm.roberta.max_tokens
         else:
             raise ValueError(f"Неизвестная модель эмбеддингов: {embedding_model}")
+
+        # При наличии PCA-проекции коллекция создается с уменьшенной размерностью
+        pca_dir = settings.database.vector_store.pca_dir
+        if pca_dir and os.path.exists(os.path.join(pca_dir, f"pca_{embedding_model}.npz")):
+            embedding_dim = PCAProjection.load(os.path.join(pca_dir, f"pca_{embedding_model}.npz")).n_components
         
         # Создаем имя коллекции
         collection_name = f"{settings.database.name}_{embedding_model}"
@@ -86,10 +91,12 @@ def create_collection(settings, embedding_model: str) -> Optional[Collection]:
         # Создаем схему коллекции
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, max_length=360, is_primary=True),
-            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100),
+            # Ключ партиционирования: Milvus раскладывает записи по партициям по хэшу категории
+            # и при фильтре по category ищет только в нужных партициях
+            FieldSchema(name="category", dtype=DataType.VARCHAR, max_length=100, is_partition_key=True),
             FieldSchema(name="created_at", dtype=DataType.VARCHAR, max_length=250),
             FieldSchema(name="contents", dtype=DataType.VARCHAR, max_length=60535),
-            FieldSchema(name=settings.database.vector_store.table_name, dtype=DataType.FLOAT_VECTOR,
+            FieldSchema(name=settings.database.vector_store.table_name, dtype=DataType[settings.database.vector_store.vector_dtype],
                         dim=embedding_dim)
         ]
         
@@ -99,23 +106,20 @@ def create_collection(settings, embedding_model: str) -> Optional[Collection]:
         collection = Collection(
             name=collection_name,
             schema=schema,
+            num_partitions=settings.database.vector_store.num_partitions,
             using=settings.database.name
         )
         
         print(f"Создана коллекция: {collection_name}")
-        
-        # Создаем индекс
-        index_params = {
-            "metric_type": "IP",
-            "index_type": "DISKANN",
-            "params": {
-                "search_list": 100
-            }
-        }
-        
+
+        if defer_index:
+            print(f"Индекс для коллекции {collection_name} будет создан после загрузки данных")
+            return collection
+
+        # Создаем индекс с параметрами из настроек
         collection.create_index(
             field_name=settings.database.vector_store.table_name,
-            index_params=index_params
+            index_params=settings.database.vector_store.index_params
         )
         
         print(f"Создан индекс для коллекции: {collection_name}")
@@ -146,13 +150,14 @@ def drop_collection(settings, collection_name: str) -> bool:
         return False
 
 
-def init_collections(settings, force: bool = False) -> None:
+def init_collections(settings, force: bool = False, defer_index: bool = True) -> None:
     """
     Инициализирует коллекции для всех поддерживаемых моделей эмбеддингов.
     
     Args:
         settings: Настройки приложения
         force: Если True, пересоздает коллекции, даже если они уже существуют
+        defer_index: Если True, индексы создаются после загрузки данных
     """
     # Поддерживаемые модели эмбеддингов
     embedding_models = ["roberta", "openai"]
@@ -174,7 +179,7 @@ def init_collections(settings, force: bool = False) -> None:
             drop_collection(settings, collection_name)
         
         # Создаем новую коллекцию
-        create_collection(settings, model)
+        create_collection(settings, model, defer_index=defer_index)
 
 
 def main():
@@ -183,6 +188,7 @@ def main():
     """
     parser = argparse.ArgumentParser(description="Инициализация коллекций Milvus")
     parser.add_argument("--force", action="store_true", help="Пересоздать коллекции, даже если они уже существуют")
+    parser.add_argument("--eager-index", action="store_true", help="Создать индексы сразу, до загрузки данных")
     args = parser.parse_args()
     
     # Получаем настройки приложения
@@ -193,7 +199,7 @@ def main():
         return
     
     # Инициализируем коллекции
-    init_collections(settings, force=args.force)
+    init_collections(settings, force=args.force, defer_index=not args.eager_index)
     
     print("Инициализация коллекций Milvus успешно завершена")
 
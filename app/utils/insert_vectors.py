@@ -5,13 +5,15 @@ app_root = Path(__file__).parent.parent
 sys.path.append(str(app_root))
 
 import json  # noqa: E402
-from datetime import datetime  # noqa: E402
+import orjson  # noqa: E402
+from datetime import datetime, timedelta  # noqa: E402
 
 import pandas as pd  # noqa: E402
 from services.vector_store import VectorStore  # noqa: E402
 from timescale_vector.client import uuid_from_time  # noqa: E402
 from minio import Minio  # noqa: E402
 from minio.error import S3Error  # noqa: E402
+from utils.minio_download import download_object  # noqa: E402
 
 # Initialize VectorStore and MinIO client
 vec = VectorStore(local=True)
@@ -40,18 +42,19 @@ def load_data():
         minio_path = "dataset.json"
 
         # Try to get the file from MinIO
-        data = minio_client.get_object(BUCKET_NAME, minio_path)
-        return json.loads(data.read().decode("utf-8"))
+        # Parallel ranged download into one buffer; orjson parses the raw bytes directly
+        return orjson.loads(download_object(minio_client, BUCKET_NAME, minio_path))
     except (json.JSONDecodeError, FileNotFoundError, S3Error) as e:
         print(f"Error loading dataset: {e}")
         sys.exit(1)
 
 
 # Prepare data for insertion
-def prepare_record(row):
-    """Prepare a record for insertion into the vector store.
+def prepare_records(data):
+    """Prepare records for insertion into the vector store.
 
-    This function creates a record with a UUID version 1 as the ID, which captures
+    This function builds the records column by column, embedding all contents in
+    batches. Each record gets a UUID version 1 as the ID, which captures
     the current time or a specified time.
 
     Note:
@@ -68,25 +71,25 @@ def prepare_record(row):
 
         This is useful when your content already has an associated datetime.
     """
-    content = f"Question: {row['question']}\nAnswer: {row['answer']}"
-    embedding = vec.get_embedding(content)
-    return pd.Series(
+    contents = [f"Question: {r['question']}\nAnswer: {r['answer']}" for r in data]
+    # Embeddings are generated in batches, one API request per 64 records
+    embeddings = vec.get_embeddings(contents, batch_size=64)
+    # One clock read: IDs are UUIDv1 for t0 + i microseconds, unique and increasing in record order
+    t0 = datetime.now()
+    now_iso = t0.isoformat()
+    return pd.DataFrame(
         {
-            "id": str(uuid_from_time(datetime.now())),
-            "metadata": {
-                "category": row["category"],
-                "created_at": datetime.now().isoformat(),
-            },
-            "contents": content,
-            "embedding": embedding,
+            "id": [str(uuid_from_time(t0 + timedelta(microseconds=i))) for i in range(len(data))],
+            "metadata": [{"category": r["category"], "created_at": now_iso} for r in data],
+            "contents": contents,
+            "embedding": embeddings,
         }
     )
 
 
 # Load data from JSON file
 data = load_data()
-df = pd.DataFrame(data)
-records_df = df.apply(prepare_record, axis=1)
+records_df = prepare_records(data)
 
 # Create tables and insert data
 vec.create_tables()
@@ -5,14 +5,15 @@ app_root = Path(__file__).parent.parent
 sys.path.append(str(app_root))
 
 import json  # noqa: E402
+import orjson  # noqa: E402
 from datetime import datetime, timezone  # noqa: E402
 import asyncio  # noqa: E402
 
-import pandas as pd  # noqa: E402
 from services.vector_store import VectorStore  # noqa: E402
 from database.elasticsearch_client import get_elasticsearch_client  # noqa: E402
 from minio import Minio  # noqa: E402
 from minio.error import S3Error  # noqa: E402
+from utils.minio_download import download_object  # noqa: E402
 
 # Initialize VectorStore and Elasticsearch client
 vec = VectorStore(local=True)
@@ -39,26 +40,30 @@ except S3Error as e:
 def load_data():
     try:
         # Try to get the file from MinIO
-        data = minio_client.get_object(BUCKET_NAME, "dataset.json")
-        return json.loads(data.read().decode("utf-8"))
+        # Parallel ranged download into one buffer; orjson parses the raw bytes directly
+        return orjson.loads(download_object(minio_client, BUCKET_NAME, "dataset.json"))
     except (json.JSONDecodeError, FileNotFoundError, S3Error) as e:
         print(f"Error loading dataset: {e}")
         sys.exit(1)
 
 
-def prepare_record(row):
-    """Prepare a record for insertion into Elasticsearch"""
-    content = f"Question: {row['question']}\nAnswer: {row['answer']}"
-    embedding = vec.get_embedding(content)
-
-    return {
-        "content": content,
-        "metadata": {
-            "category": row["category"],
-        },
-        "embedding": embedding,
-        "created_at": datetime.now(timezone.utc).isoformat(),
-    }
+def prepare_records(data):
+    """Prepare all records for insertion into Elasticsearch, column by column instead of per DataFrame row"""
+    contents = [f"Question: {r['question']}\nAnswer: {r['answer']}" for r in data]
+    # Embeddings are generated in batches, one API request per 64 records
+    embeddings = vec.get_embeddings(contents, batch_size=64)
+    now_iso = datetime.now(timezone.utc).isoformat()
+    return [
+        {
+            "content": content,
+            "metadata": {
+                "category": r["category"],
+            },
+            "embedding": embedding,
+            "created_at": now_iso,
+        }
+        for r, content, embedding in zip(data, contents, embeddings)
+    ]
 
 
 async def main():
@@ -75,20 +80,13 @@ async def main():
         print("Index created successfully")
 
         # Load and prepare data
-        data = load_data()
-        df = pd.DataFrame(data)
-
-        # Process and insert records
-        for idx, row in df.iterrows():
-            record = prepare_record(row)
-            doc_id = str(idx)
-
-            try:
-                await es_client.index_document(doc_id=doc_id, document=record)
-                if (idx + 1) % 100 == 0:
-                    print(f"Processed {idx + 1} records")
-            except Exception as e:
-                print(f"Error inserting document {doc_id}: {e}")
+        records = prepare_records(load_data())
+
+        # Insert records with the bulk API, 500 documents per request
+        success, errors = await es_client.bulk_index((str(idx), record) for idx, record in enumerate(records))
+        print(f"Processed {success} records")
+        for error in errors:
+            print(f"Error inserting document: {error}")
     finally:
         # Ensure the client is properly closed
         await es_client.close()
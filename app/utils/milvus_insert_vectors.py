@@ -7,14 +7,18 @@ sys.path.append(str(app_root))
 from services.milvus_vector_store import MilvusVectorStore
 
 import json
-from datetime import datetime
+import orjson
+from datetime import datetime, timedelta
 
-import pandas as pd
 from timescale_vector.client import uuid_from_time
 from minio import Minio
 from minio.error import S3Error
+from utils.minio_download import download_object
 
 
+# Rows per Milvus insert RPC: ~5000 records with 1536-dim embeddings stay well under the 256 MB request limit
+INSERT_BATCH_SIZE = 5000
+
 # Initialize VectorStore and MinIO client
 vec = MilvusVectorStore()
 
@@ -42,40 +46,42 @@ def load_data():
         minio_path = "dataset.json"
 
         # Try to get the file from MinIO
-        data = minio_client.get_object(BUCKET_NAME, minio_path)
-        return json.loads(data.read().decode("utf-8"))
+        # Parallel ranged download into one buffer; orjson parses the raw bytes directly
+        return orjson.loads(download_object(minio_client, BUCKET_NAME, minio_path))
     except (json.JSONDecodeError, FileNotFoundError, S3Error) as e:
         print(f"Error loading dataset: {e}")
         sys.exit(1)
 
 
-def prepare_record(row):
-    content = f"Question: {row['question']}\nAnswer: {row['answer']}"
-    embedding = vec.get_embedding(content)
-    return pd.Series(
-        {
-            "id": str(uuid_from_time(datetime.now())),
-            "category": row["category"],
-            "created_at": datetime.now().isoformat(),
-            "contents": content,
-            "embeddings": embedding,
-        }
-    )
+def prepare_records(data):
+    """Колонки для вставки в Milvus: списки полей и массив эмбеддингов float32 формы (N, dim)."""
+    contents = [f"Question: {r['question']}\nAnswer: {r['answer']}" for r in data]
+    # Эмбеддинги считаются батчами по 64 записи за один вызов модели
+    embeddings = vec.get_embeddings_array(contents, batch_size=64)
+    # One clock read: IDs are UUIDv1 for t0 + i microseconds, unique and increasing in record order
+    t0 = datetime.now()
+    now_iso = t0.isoformat()
+    return {
+        "id": [str(uuid_from_time(t0 + timedelta(microseconds=i))) for i in range(len(data))],
+        "category": [r["category"] for r in data],
+        "created_at": [now_iso] * len(data),
+        "contents": contents,
+        vec.vector_settings.table_name: embeddings,
+    }
 
 
 # Load data from JSON file
 data = load_data()
-
-df = pd.DataFrame(data)
-records_df = df.apply(prepare_record, axis=1)
+records = prepare_records(data)
 
 
 if vec.is_connected:
     print("✅ Подключение к Milvus установлено!")
     # vec.create_tables()
     # vec.create_index()
-    vec.insert(records_df)
-    # vec.upsert(records_df)
+    # Пакетная вставка по INSERT_BATCH_SIZE строк с одним flush в конце; затем сегменты сливаются
+    # и индекс строится один раз по всем данным (если коллекция создана с отложенным индексом)
+    vec.insert_columns(records, batch_size=INSERT_BATCH_SIZE, compact=True)
 else:
     print("❌ К сожалению подключение к Milvus не установлено!")
 
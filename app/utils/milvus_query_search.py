@@ -1,3 +1,4 @@
+import argparse
 import sys
 from pathlib import Path
 
@@ -7,17 +8,33 @@ sys.path.append(str(app_root))
 from services.milvus_vector_store import MilvusVectorStore
 
 
-vec = MilvusVectorStore()
+def main():
+    parser = argparse.ArgumentParser(description="Поиск по коллекции Milvus")
+    parser.add_argument("--model", choices=["roberta", "openai"], default="openai", help="Модель эмбеддингов")
+    parser.add_argument("--top-k", type=int, default=5, help="Количество результатов")
+    parser.add_argument("--query", default="Technodom қандай кәсіби даму", help="Поисковый запрос")
+    parser.add_argument("--serve", action="store_true",
+                        help="Загрузить коллекцию один раз и читать запросы из stdin (по одному на строку)")
+    args = parser.parse_args()
 
-query = "Technodom қандай кәсіби даму"
+    # Коллекция загружается в память один раз на процесс
+    vec = MilvusVectorStore(embedding_model=args.model)
+
+    if not vec.is_connected:
+        print("❌ К сожалению подключение к Milvus не установлено!")
+        return
 
-if vec.is_connected:
     print("✅ Подключение к Milvus установлено!")
-    result = vec.search(query=query)
-    # result = vec.query()
-    print(result)
-else:
-    print("❌ К сожалению подключение к Milvus не установлено!")
+    if not args.serve:
+        print(vec.search(query=args.query, top_k=args.top_k))
+        # result = vec.query()
+        return
 
+    for line in sys.stdin:
+        query = line.strip()
+        if query:
+            print(vec.search(query=query, top_k=args.top_k), flush=True)
 
 
+if __name__ == "__main__":
+    main()
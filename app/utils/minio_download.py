@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from minio import Minio
+
+# Objects smaller than one part are downloaded with a single GET
+MIN_PART_SIZE = 8 * 1024 * 1024
+# Read size for each response stream: large reads mean fewer recv() calls per part
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def download_object(client: Minio, bucket_name: str, object_name: str, parts: int = 8) -> bytearray:
+    """
+    Download an object with concurrent ranged GETs.
+
+    The object is split into up to `parts` byte ranges that are fetched in parallel
+    and written straight into one preallocated buffer at their offsets.
+    """
+    size = client.stat_object(bucket_name, object_name).size
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+
+    parts = max(1, min(parts, size // MIN_PART_SIZE))
+    bounds = [size * i // parts for i in range(parts + 1)]
+
+    def fetch(start: int, end: int) -> None:
+        response = client.get_object(bucket_name, object_name, offset=start, length=end - start)
+        try:
+            offset = start
+            for chunk in response.stream(STREAM_CHUNK_SIZE):
+                view[offset:offset + len(chunk)] = chunk
+                offset += len(chunk)
+        finally:
+            response.close()
+            response.release_conn()
+
+    with ThreadPoolExecutor(max_workers=parts) as executor:
+        for future in [executor.submit(fetch, start, end) for start, end in zip(bounds, bounds[1:]) if end > start]:
+            future.result()
+
+    return buffer
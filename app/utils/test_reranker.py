@@ -1,6 +1,5 @@
 import sys
 import os
-import json
 from typing import List, Dict, Any
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -28,16 +27,7 @@ def test_reranker():
         print("Документы не найдены")
         return
 
-    documents = [
-        {
-            "id": row["id"],
-            "category": row["category"],
-            "contents": row["contents"],
-            "created_at": row["created_at"],
-            "distance": row["distance"]
-        }
-        for _, row in results.iterrows()
-    ]
+    documents = results[["id", "category", "contents", "created_at", "distance"]].to_dict(orient="records")
 
     # Вывод исходных результатов
     print("\nИсходные результаты (топ-50):")
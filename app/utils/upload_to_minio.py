@@ -14,8 +14,10 @@ if not minio_client.bucket_exists(BUCKET_NAME):
 # Path to your dataset.json
 data_file = Path("data/dataset.json")
 
-# Upload file
-with open(data_file, "rb") as f:
-    minio_client.put_object(BUCKET_NAME, "dataset.json", f, length=data_file.stat().st_size)  # name in MinIO
+# Upload file: the SDK reads it from disk itself and sends 16 MB parts concurrently
+minio_client.fput_object(
+    BUCKET_NAME, "dataset.json", str(data_file),  # name in MinIO
+    part_size=16 * 1024 * 1024, num_parallel_uploads=8,
+)
 
 print(f"Successfully uploaded {data_file} to MinIO bucket '{BUCKET_NAME}'")
@@ -1,34 +1,44 @@
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Set paths
 repo_path = "/Users/eldar/ivt/llm-pipeline"  # Path to the local GitHub repo
 output_file = "documentation.docx"  # Change to .pdf for PDF output
 docs_folder = os.path.join(repo_path, "docs")
-combined_md = "combined.md"  # Temporary file to hold combined markdown
 
 
-# Function to collect Markdown files and combine them
-def collect_and_combine_markdown(base_path, output_path):
+# Function to collect Markdown files in a predictable order
+def collect_markdown_files(base_path):
     md_files = []
     for root, _, files in os.walk(base_path):
         for file in sorted(files):  # Sorting ensures predictable order
             if file.endswith(".md"):
                 md_files.append(os.path.join(root, file))
+    return md_files
 
-    with open(output_path, "w", encoding="utf-8") as outfile:
-        for md_file in md_files:
-            with open(md_file, "r", encoding="utf-8") as infile:
-                outfile.write(infile.read() + "\n\n")
-    print(f"Combined Markdown saved to {output_path}")
+
+# Function to read Markdown files concurrently, keeping their order
+def read_markdown_files(md_files, max_workers=16):
+    # Overlaps the per-file open/read latency; bytes skip the utf-8 decode/encode round-trip
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda p: Path(p).read_bytes(), md_files))
+
+
+# Function to collect Markdown files and combine them in memory
+def collect_and_combine_markdown(base_path):
+    chunks = read_markdown_files(collect_markdown_files(base_path))
+    print(f"Combined {len(chunks)} Markdown files")
+    return b"".join(chunk + b"\n\n" for chunk in chunks)
 
 
 # Function to convert Markdown to DOCX or PDF
-def convert_to_docx_or_pdf(md_file, output_file):
+def convert_to_docx_or_pdf(markdown, output_file):
     try:
-        subprocess.run(["pandoc", md_file, "-o", output_file], check=True)
-        print(f"Converted {md_file} to {output_file}")
+        # Markdown goes to pandoc's stdin, so no temporary combined file is written and read back
+        subprocess.run(["pandoc", "-f", "markdown", "-o", output_file], input=markdown, check=True)
+        print(f"Converted Markdown to {output_file}")
     except subprocess.CalledProcessError as e:
         print("Error during conversion:", e)
 
@@ -36,10 +46,7 @@ def convert_to_docx_or_pdf(md_file, output_file):
 # Main execution
 if __name__ == "__main__":
     # Combine all Markdown files
-    collect_and_combine_markdown(docs_folder, combined_md)
+    markdown = collect_and_combine_markdown(docs_folder)
 
     # Convert to DOCX or PDF
-    convert_to_docx_or_pdf(combined_md, output_file)
-
-    # Cleanup (optional)
-    os.remove(combined_md)
+    convert_to_docx_or_pdf(markdown, output_file)
@@ -8,7 +8,7 @@ from telegram.ext import (ApplicationBuilder, CommandHandler, ContextTypes,
 # from app.api.endpoint import ask
 # from pydantic import BaseModel
 import json
-import requests
+import httpx
 
 load_dotenv()
 
@@ -18,6 +18,14 @@ logging.basicConfig(
 )
 TELEGRAM_API_TOKEN = os.getenv("TELEGRAM_API_TOKEN")
 
+# Define the API endpoint for the /ask route
+API_URL = "http://localhost:8000/ask"
+
+# One keep-alive client for all messages, so each turn reuses a pooled connection instead of a new TCP/TLS handshake
+http_client = httpx.AsyncClient(
+    timeout=None, limits=httpx.Limits(max_connections=20, max_keepalive_connections=20)
+)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_message(chat_id=update.effective_chat.id, text="Қош келдіңіз!")
 
@@ -49,12 +57,9 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     ######### With url: #########
 
-    # Define the API endpoint for the /ask route
-    api_url = "http://localhost:8000/ask "
-
     try:
         # Make a POST request to the /ask endpoint with the question
-        response = requests.post(api_url, json={"question": question})
+        response = await http_client.post(API_URL, json={"question": question})
 
         # Check if the response is successful
         if response.status_code == 200:
@@ -70,10 +75,14 @@ async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Send the answer back to the user via Telegram
     await context.bot.send_message(chat_id=update.effective_chat.id, text=answer)
-    
+
+
+async def close_http_client(application):
+    await http_client.aclose()
+
 
 if __name__ == '__main__':
-    application = ApplicationBuilder().token(TELEGRAM_API_TOKEN).build()
+    application = ApplicationBuilder().token(TELEGRAM_API_TOKEN).post_shutdown(close_http_client).build()
 
     start_handler = CommandHandler('start', start)
     echo_handler = MessageHandler(filters.TEXT & (~filters.COMMAND), echo)
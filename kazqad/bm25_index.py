@@ -0,0 +1,275 @@
+import json
+import os
+
+import numpy as np
+from typing import Dict, Sequence, Tuple
+
+try:
+    import numba
+except ImportError:  # numba необязателен: без него используется NumPy-версия скоринга
+    numba = None
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy необязателен: без него пакетный скоринг идет по одному запросу
+    sparse = None
+
+
+def _accumulate_scores(term_ids, offsets, docids, weights, scores):
+    """
+    Сложение предвычисленных вкладов BM25 по постингам термов запроса в scores за один проход, без временных массивов
+    """
+    for i in range(term_ids.shape[0]):
+        t = term_ids[i]
+        for j in range(offsets[t], offsets[t + 1]):
+            scores[docids[j]] += weights[j]
+
+
+if numba is not None:
+    # Последовательное ядро: списки постингов короткие, запуск потоков на каждый терм дороже самого цикла
+    _accumulate_scores = numba.njit(cache=True, nogil=True)(_accumulate_scores)
+
+
+# Массивы индекса, сохраняемые save() по отдельным .npy файлам, чтобы load() мог отобразить их в память
+INDEX_ARRAYS = (
+    'postings_docid', 'postings_tf', 'postings_offsets', 'postings_weight',
+    'max_score', 'doc_len', 'doc_norm', 'idf', 'doc_tokens', 'doc_offsets'
+)
+
+
+class BM25Index:
+    """
+    BM25 индекс (варианты 'plus' и 'classic') в виде выровненных массивов NumPy.
+
+    Постинги хранятся как CSR по термам: документы терма t лежат в
+    postings_docid[postings_offsets[t]:postings_offsets[t + 1]] (по возрастанию),
+    частоты терма в них — в postings_tf по тем же позициям.
+    Сами документы хранятся как id термов в исходном порядке: документ d —
+    doc_tokens[doc_offsets[d]:doc_offsets[d + 1]].
+    Формулы и константы совпадают с rank_bm25.BM25Plus / BM25Okapi.
+    """
+
+    def __init__(
+            self,
+            tokenized_corpus: Sequence[Sequence[str]],
+            variant: str = 'plus',
+            k1: float = 1.5,
+            b: float = 0.75,
+            delta: float = 1.0,
+            epsilon: float = 0.25
+    ):
+        """
+        Построение индекса по токенизированному корпусу
+
+        :param tokenized_corpus: Список документов, каждый — список токенов
+        :param variant: Вариант BM25 ('plus' или 'classic')
+        :param k1: Параметр насыщения частоты терма
+        :param b: Параметр нормализации по длине документа
+        :param delta: Нижняя граница вклада терма (только для 'plus')
+        :param epsilon: Доля среднего IDF для отрицательных IDF (только для 'classic')
+        """
+        self.variant = 'plus' if variant.lower() == 'plus' else 'classic'
+        self.k1 = k1
+        self.b = b
+        self.delta = delta
+        self.n_docs = len(tokenized_corpus)
+
+        # Словарь термов: токен -> id в порядке первого появления
+        self.vocab: Dict[str, int] = {}
+        term_ids = np.fromiter(
+            (self.vocab.setdefault(token, len(self.vocab)) for doc in tokenized_corpus for token in doc),
+            dtype=np.int64
+        )
+        doc_len = np.fromiter((len(doc) for doc in tokenized_corpus), dtype=np.int64, count=self.n_docs)
+        doc_ids = np.repeat(np.arange(self.n_docs, dtype=np.int64), doc_len)
+        self.doc_tokens = term_ids.astype(np.int32)
+        self.doc_offsets = np.zeros(self.n_docs + 1, dtype=np.int64)
+        np.cumsum(doc_len, out=self.doc_offsets[1:])
+
+        # Пары (терм, документ), отсортированные по терму, затем по документу; число повторов — tf
+        keys, tf = np.unique(term_ids * self.n_docs + doc_ids, return_counts=True)
+        postings_term = keys // self.n_docs
+        self.postings_docid = (keys % self.n_docs).astype(np.int32)
+        # Частоты — небольшие целые: хранятся в наименьшем беззнаковом типе без потерь (обычно uint8/uint16)
+        self.postings_tf = tf.astype(np.min_scalar_type(tf.max(initial=0)))
+        self.postings_offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(postings_term, minlength=len(self.vocab)), out=self.postings_offsets[1:])
+
+        self.doc_len = doc_len.astype(np.float32)
+        self.avgdl = float(doc_len.sum()) / self.n_docs
+        # k1 * (1 - b + b * dl / avgdl) зависит только от документа — считаем один раз
+        self.doc_norm = (k1 * (1 - b + b * self.doc_len / self.avgdl)).astype(np.float32)
+
+        doc_freq = np.diff(self.postings_offsets).astype(np.float64)
+        if self.variant == 'plus':
+            idf = np.log((self.n_docs + 1) / doc_freq)
+        else:
+            idf = np.log(self.n_docs - doc_freq + 0.5) - np.log(doc_freq + 0.5)
+            idf[idf < 0] = epsilon * idf.mean()
+        self.idf = idf.astype(np.float32)
+
+        # Вклад каждого постинга без BM25+ delta и его максимум по терму — верхняя граница для MaxScore
+        term_idf = np.repeat(self.idf, np.diff(self.postings_offsets))
+        tf = self.postings_tf.astype(np.float32)
+        self.postings_weight = term_idf * (tf * (k1 + 1)) / (tf + self.doc_norm[self.postings_docid])
+        self.max_score = np.maximum.reduceat(self.postings_weight, self.postings_offsets[:-1])
+        self._weights = None
+
+    def save(self, path: str) -> None:
+        """
+        Сохранение индекса в каталог: массивы — .npy, параметры и словарь термов — index.json
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in INDEX_ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'variant': self.variant, 'k1': self.k1, 'b': self.b, 'delta': self.delta,
+            'n_docs': self.n_docs, 'avgdl': self.avgdl,
+            'terms': list(self.vocab),  # порядок вставки совпадает с id термов
+        }
+        with open(os.path.join(path, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> 'BM25Index':
+        """
+        Загрузка индекса, сохраненного save(); массивы по умолчанию отображаются в память только для чтения,
+        поэтому холодный старт не читает постинги целиком, а несколько процессов делят одни страницы
+        """
+        with open(os.path.join(path, 'index.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        index = cls.__new__(cls)
+        for name in ('variant', 'k1', 'b', 'delta', 'n_docs', 'avgdl'):
+            setattr(index, name, meta[name])
+        index.vocab = {term: i for i, term in enumerate(meta['terms'])}
+        for name in INDEX_ARRAYS:
+            setattr(index, name, np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode))
+        index._weights = None
+        return index
+
+    def term_ids(self, tokens: Sequence[str]) -> np.ndarray:
+        """
+        Перевод токенов в id термов; токены вне словаря пропускаются
+        """
+        vocab = self.vocab
+        return np.fromiter((vocab[token] for token in tokens if token in vocab), dtype=np.int64)
+
+    def get_scores(self, tokens: Sequence[str]) -> np.ndarray:
+        """
+        BM25 scores запроса для всех документов корпуса
+
+        :param tokens: Токены запроса (повторы учитываются, как в rank_bm25)
+        :return: Массив float32 длины n_docs
+        """
+        return self.get_scores_for_ids(self.term_ids(tokens))
+
+    def get_scores_for_ids(self, ids: np.ndarray) -> np.ndarray:
+        """
+        BM25 scores запроса, уже переведенного в id термов, для всех документов корпуса
+
+        k1, b, avgdl и idf свернуты в postings_weight при построении индекса,
+        поэтому скоринг — только сложение весов постингов.
+        """
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if numba is not None:
+            _accumulate_scores(ids, self.postings_offsets, self.postings_docid, self.postings_weight, scores)
+        else:
+            for t in ids:
+                start, end = self.postings_offsets[t], self.postings_offsets[t + 1]
+                # Документы внутри списка терма уникальны, поэтому хватает fancy-indexing без np.add.at
+                scores[self.postings_docid[start:end]] += self.postings_weight[start:end]
+        if self.variant == 'plus':
+            # В BM25+ каждый терм запроса добавляет idf * delta всем документам, включая tf = 0
+            scores += self.delta * self.idf[ids].sum()
+        return scores
+
+    @property
+    def weights(self):
+        """
+        Предвычисленные BM25 веса (терм, документ) как scipy.sparse CSR матрица (n_terms, n_docs)
+        """
+        if self._weights is None:
+            # CSR по термам совпадает с раскладкой постингов, поэтому матрица строится без копирования индексов
+            self._weights = sparse.csr_matrix(
+                (self.postings_weight, self.postings_docid, self.postings_offsets),
+                shape=(len(self.vocab), self.n_docs)
+            )
+        return self._weights
+
+    def top_k(self, term_ids: np.ndarray, k: int, candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Точные top-k документов запроса с отсечением MaxScore
+
+        Термы обходятся по убыванию максимального вклада max_score. Как только k-й лучший
+        частичный score превышает сумму максимальных вкладов оставшихся термов, документы ниже
+        порога уже не могут попасть в top-k. Оставшиеся (неосновные) термы досчитываются только
+        для документов, которые еще могут его достичь, бинарным поиском по их спискам постингов.
+
+        :param term_ids: id термов запроса (повторы учитываются, как в get_scores)
+        :param k: Количество возвращаемых документов
+        :param candidates: Отсортированные id документов, содержащих хотя бы один терм запроса
+        :return: id документов и их scores по убыванию score
+        """
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        ids, counts = np.unique(term_ids, return_counts=True)
+        upper = self.max_score[ids] * counts
+        order = np.argsort(-upper, kind='stable')
+        ids, counts, upper = ids[order], counts[order], upper[order]
+        # remaining[i] — максимально возможный вклад термов начиная с i-го
+        remaining = np.append(np.cumsum(upper[::-1])[::-1], 0)
+
+        offsets = self.postings_offsets
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        pool = candidates
+        i = 0
+        while i < len(ids):
+            start, end = offsets[ids[i]], offsets[ids[i] + 1]
+            scores[self.postings_docid[start:end]] += counts[i] * self.postings_weight[start:end]
+            i += 1
+            if i < len(ids):
+                threshold = np.partition(scores[candidates], -k)[-k]
+                if threshold > remaining[i]:
+                    pool = candidates[scores[candidates] >= threshold - remaining[i]]
+                    break
+
+        # Неосновные термы: вклад только в документы из pool
+        for j in range(i, len(ids)):
+            start, end = offsets[ids[j]], offsets[ids[j] + 1]
+            docs = self.postings_docid[start:end]
+            positions = np.minimum(np.searchsorted(docs, pool), len(docs) - 1)
+            hit = docs[positions] == pool
+            scores[pool[hit]] += counts[j] * self.postings_weight[start + positions[hit]]
+
+        pool_scores = scores[pool]
+        top = np.argpartition(pool_scores, -k)[-k:]
+        top = top[np.argsort(-pool_scores[top])]
+        top_scores = pool_scores[top]
+        if self.variant == 'plus':
+            top_scores = top_scores + self.delta * np.float32((self.idf[ids] * counts).sum())
+        return pool[top], top_scores
+
+    def get_scores_batch(self, queries: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        BM25 scores нескольких запросов одним умножением разреженной матрицы запросов на матрицу весов
+
+        :param queries: Список запросов, каждый — массив id термов (см. term_ids)
+        :return: Массив float32 формы (len(queries), n_docs)
+        """
+        if not queries:
+            return np.zeros((0, self.n_docs), dtype=np.float32)
+        if sparse is None:
+            return np.stack([self.get_scores_for_ids(term_ids) for term_ids in queries])
+
+        rows = np.repeat(np.arange(len(queries)), [len(term_ids) for term_ids in queries])
+        cols = np.concatenate(queries)
+        # Повторы терма суммируются в одну ячейку, как повторный проход по терму в get_scores
+        query_matrix = sparse.csr_matrix(
+            (np.ones(len(cols), dtype=np.float32), (rows, cols)), shape=(len(queries), len(self.vocab))
+        )
+        scores = (query_matrix @ self.weights).toarray().astype(np.float32, copy=False)
+        if self.variant == 'plus':
+            scores += self.delta * (query_matrix @ self.idf)[:, None]
+        return scores
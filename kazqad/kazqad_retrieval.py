@@ -1,15 +1,21 @@
 import os
 import re
 import sys
+import json
+import shutil
+import hashlib
+import heapq
+from collections import deque
 import numpy as np
-from typing import List, Dict, Optional, Any, Tuple, Set
+from typing import List, Dict, Optional, Any, Tuple, Sequence, Iterable, Callable
 import logging
-from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 import time
 
 from datasets import load_dataset
-from rank_bm25 import BM25Okapi, BM25Plus
-from tokenizer import KazakhTokenizer
+from bm25_index import BM25Index
+from tokenizer import KazakhTokenizer, TOKENIZER_VERSION
 
 
 class KazQADRetrievalError(Exception):
@@ -27,12 +33,81 @@ class InvalidQueryError(KazQADRetrievalError):
     pass
 
 
-# Fix for Windows console encoding issues
-if sys.platform == 'win32':
-    import io
+# Шаблон очистки passages компилируется один раз на модуль
+HTML_TAG_RE = re.compile(r'<[^>]+>')
 
-    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
+
+# Начиная с этого числа passages токенизация распределяется по процессам
+PARALLEL_TOKENIZE_MIN_PASSAGES = 5000
+# Размер пачки passages, отправляемой на токенизацию, и максимум пачек в работе у пула процессов
+TOKENIZE_BATCH_SIZE = 256
+TOKENIZE_MAX_PENDING_BATCHES = 32
+# Версия формата дискового кэша индекса; увеличивается при изменении очистки, токенизации или индекса
+INDEX_CACHE_VERSION = 3
+
+# BM25 индекс процесса-воркера batch_retrieve, открывается из дискового кэша в _init_batch_worker
+_WORKER_INDEX: Optional[BM25Index] = None
+
+
+def tokenize_text(text: str, use_stemming: bool = True) -> List[str]:
+    """
+    Токенизация с использованием KazakhTokenizer; функция модуля, чтобы ее можно было передать в пул процессов
+    """
+    return KazakhTokenizer.tokenize(text, apply_stemming=use_stemming)
+
+
+def tokenize_batch(texts: List[str], use_stemming: bool = True) -> List[List[str]]:
+    """
+    Токенизация пачки текстов одной задачей пула процессов
+    """
+    return KazakhTokenizer.tokenize_batch(texts, apply_stemming=use_stemming)
+
+
+@lru_cache(maxsize=4)
+def load_kazqad_dataset(dataset_name: str, cache_dir: str):
+    """
+    Загрузка датасета HuggingFace; повторные экземпляры KazQADRetrieval в одном процессе
+    (например, в тестах) получают уже открытый DatasetDict без повторного обращения к кэшу HF
+    """
+    return load_dataset(dataset_name, cache_dir=cache_dir)
+
+
+def count_kazakh_chars(text: str) -> int:
+    """
+    Количество специфичных казахских букв в тексте
+    """
+    # Девять проходов str.count в C быстрее поиска по классу символов: findall строит список совпадений
+    return sum(map(text.count, KazakhTokenizer.KAZAKH_CHARS))
+
+
+def _init_batch_worker(index_dir: str) -> None:
+    """
+    Инициализатор воркера пула batch_retrieve: массивы индекса отображаются из кэша (mmap) только для чтения,
+    поэтому все воркеры делят одни страницы page cache и индекс не копируется и не передается через pickle
+    """
+    global _WORKER_INDEX
+    _WORKER_INDEX = BM25Index.load(index_dir)
+
+
+def _top_k_batch_worker(batch: List[np.ndarray], top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    top_k для пачки запросов (id термов) в воркере; обратно передаются только id документов и их scores
+    """
+    index = _WORKER_INDEX
+    offsets = index.postings_offsets
+    results = []
+    for term_ids in batch:
+        candidate_mask = np.zeros(index.n_docs, dtype=bool)
+        for t in term_ids:
+            candidate_mask[index.postings_docid[offsets[t]:offsets[t + 1]]] = True
+        results.append(index.top_k(term_ids, top_k, np.flatnonzero(candidate_mask)))
+    return results
+
+
+# Fix for Windows console encoding issues: reconfigure the existing streams in place, no extra wrapper layer
+if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
 
 # Настройка логирования с решением проблемы Unicode
 logging.basicConfig(
@@ -46,18 +121,41 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class TokenizedPassages(Sequence):
+    """
+    Токены passages поверх массивов BM25 индекса
+
+    Хранит id термов всех passages подряд (int32) и смещения документов вместо списков строк;
+    список токенов собирается только для запрошенного passage.
+    """
+
+    def __init__(self, token_ids: np.ndarray, offsets: np.ndarray, terms: List[str]):
+        self.token_ids = token_ids
+        self.offsets = offsets
+        self.terms = terms
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        terms = self.terms
+        return [terms[t] for t in self.token_ids[self.offsets[idx]:self.offsets[idx + 1]]]
+
+
 class KazQADRetrieval:
     # Синонимы для расширения запросов
     KAZAKH_SYNONYMS = {
-        'қала': ['қалалар', 'қаласы', 'шаһар'],
-        'тарих': ['тарихи', 'тарихта', 'тарихшы'],
-        'астана': ['бас қала', 'елорда'],
-        'мектеп': ['оқу орны', 'білім беру'],
-        'университет': ['оқу орны', 'жоғары оқу орны'],
-        'кітап': ['кітаптар', 'оқулық'],
-        'әдебиет': ['шығарма', 'шығармалар'],
-        'ел': ['мемлекет', 'отан', 'ұлт'],
-        'жыл': ['жылдар', 'жылдық']
+        'қала': ('қалалар', 'қаласы', 'шаһар'),
+        'тарих': ('тарихи', 'тарихта', 'тарихшы'),
+        'астана': ('бас қала', 'елорда'),
+        'мектеп': ('оқу орны', 'білім беру'),
+        'университет': ('оқу орны', 'жоғары оқу орны'),
+        'кітап': ('кітаптар', 'оқулық'),
+        'әдебиет': ('шығарма', 'шығармалар'),
+        'ел': ('мемлекет', 'отан', 'ұлт'),
+        'жыл': ('жылдар', 'жылдық')
     }
 
     def __init__(
@@ -67,7 +165,8 @@ class KazQADRetrieval:
             top_k: int = 5,
             threshold: float = 0.1,  # Lowered threshold to get results
             bm25_variant: str = 'plus',
-            use_stemming: bool = True
+            use_stemming: bool = True,
+            use_index_cache: bool = True
     ):
         """
         Инициализация системы retrieval с расширенными параметрами
@@ -78,6 +177,7 @@ class KazQADRetrieval:
         :param threshold: Порог релевантности по умолчанию
         :param bm25_variant: Вариант BM25 ('classic' или 'plus')
         :param use_stemming: Использовать ли стемминг при токенизации
+        :param use_index_cache: Сохранять и загружать passages и BM25 индекс из cache_dir
         """
         start_time = time.time()
         logger.info(f"Initializing KazQADRetrieval with dataset: {dataset_name}")
@@ -88,6 +188,13 @@ class KazQADRetrieval:
         self.last_query_time = 0
         self.query_count = 0
         self.cache_hits = 0
+        # Каталог индекса в дисковом кэше; воркеры batch_retrieve открывают индекс оттуда
+        self.index_dir = None
+
+        # Кэш запросов на уровне экземпляра: lru_cache на методе класса держал бы self в общем кэше
+        self.retrieve = lru_cache(maxsize=256)(self._retrieve_impl)
+        # Отдельный кэш токенизации запросов (passages токенизируются один раз при инициализации)
+        self._tokenize_query_cached = lru_cache(maxsize=4096)(self._tokenize_to_tuple)
 
         # Установка директории кэша
         if cache_dir is None:
@@ -99,28 +206,27 @@ class KazQADRetrieval:
 
         try:
             # Загрузка датасета
-            self.dataset = load_dataset(
-                dataset_name,
-                cache_dir=cache_dir
-            )
+            self.dataset = load_kazqad_dataset(dataset_name, cache_dir)
             logger.info(f"Dataset loaded successfully: {dataset_name}")
 
-            # Подготовка passages
-            self.passages = self._extract_passages()
-            logger.info(f"Extracted {len(self.passages)} passages from dataset")
+            index_dir = os.path.join(cache_dir, f"idx_{self._index_cache_key(dataset_name, bm25_variant)}")
+            if not (use_index_cache and self._load_index_cache(index_dir)):
+                # Подготовка и токенизация passages
+                self.passages, self.tokenized_passages = self._extract_and_tokenize_passages()
+                logger.info(f"Extracted {len(self.passages)} passages from dataset")
+                logger.info(f"Tokenized {len(self.tokenized_passages)} passages")
 
-            # Токенизация passages
-            self.tokenized_passages = [
-                self._tokenize(passage) for passage in self.passages
-            ]
-            logger.info(f"Tokenized {len(self.tokenized_passages)} passages")
+                # Создание BM25 индекса (CSR-постинги, IDF и длины документов в массивах NumPy)
+                self.bm25 = BM25Index(self.tokenized_passages, variant=bm25_variant)
+                # Списки строк больше не нужны: токены читаются из id термов индекса
+                self.tokenized_passages = self._tokenized_view()
+
+                if use_index_cache:
+                    self._save_index_cache(index_dir)
 
-            # Создание BM25 индекса
-            if bm25_variant.lower() == 'plus':
-                self.bm25 = BM25Plus(self.tokenized_passages)
+            if self.bm25.variant == 'plus':
                 logger.info("Using BM25Plus ranking algorithm")
             else:
-                self.bm25 = BM25Okapi(self.tokenized_passages)
                 logger.info("Using BM25Okapi ranking algorithm")
 
             # Создание обратного индекса для быстрого поиска
@@ -133,43 +239,81 @@ class KazQADRetrieval:
             logger.error(f"Initialization failed: {str(e)}")
             raise
 
-    def _extract_passages(self) -> List[str]:
+    def _index_cache_key(self, dataset_name: str, bm25_variant: str) -> str:
         """
-        Извлечение passages из датасета с расширенной фильтрацией
+        Ключ дискового кэша индекса: датасет и его версия (fingerprint сплитов), версия токенизатора,
+        стемминг, вариант BM25
+        """
+        fingerprints = [getattr(self.dataset[split], '_fingerprint', '') for split in sorted(self.dataset.keys())]
+        key = (f"{INDEX_CACHE_VERSION}|{TOKENIZER_VERSION}|{dataset_name}|{self.use_stemming}|"
+               f"{bm25_variant.lower()}|{fingerprints}")
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+
+    def _load_index_cache(self, index_dir: str) -> bool:
         """
-        passages = []
-        passage_ids = set()  # Для отслеживания уникальных passages
+        Загрузка passages, токенов и BM25 индекса из кэша; массивы отображаются в память (mmap)
+        """
+        if not os.path.isdir(index_dir):
+            return False
+        try:
+            with open(os.path.join(index_dir, 'passages.json'), encoding='utf-8') as f:
+                self.passages = json.load(f)
+            self.bm25 = BM25Index.load(index_dir)
+            self.tokenized_passages = self._tokenized_view()
+            self.passage_lengths = np.load(os.path.join(index_dir, 'passage_lengths.npy'), mmap_mode='r')
+            self.passage_kazakh_chars = np.load(os.path.join(index_dir, 'passage_kazakh_chars.npy'), mmap_mode='r')
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Failed to load index cache {index_dir}, rebuilding: {str(e)}")
+            return False
+        self.index_dir = index_dir
+        logger.info(f"Loaded {len(self.passages)} passages and BM25 index from cache: {index_dir}")
+        return True
+
+    def _tokenized_view(self) -> TokenizedPassages:
+        return TokenizedPassages(self.bm25.doc_tokens, self.bm25.doc_offsets, list(self.bm25.vocab))
+
+    def _save_index_cache(self, index_dir: str) -> None:
+        """
+        Сохранение passages и BM25 индекса (включая токены как id термов); каталог заменяется атомарно
+        """
+        tmp_dir = f"{index_dir}.tmp{os.getpid()}"
+        try:
+            self.bm25.save(tmp_dir)
+            np.save(os.path.join(tmp_dir, 'passage_lengths.npy'), self.passage_lengths)
+            np.save(os.path.join(tmp_dir, 'passage_kazakh_chars.npy'), self.passage_kazakh_chars)
+            with open(os.path.join(tmp_dir, 'passages.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.passages, f, ensure_ascii=False)
+            os.replace(tmp_dir, index_dir)
+            self.index_dir = index_dir
+            logger.info(f"Saved BM25 index cache: {index_dir}")
+        except OSError as e:
+            logger.warning(f"Failed to save index cache {index_dir}: {str(e)}")
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _extract_passages(self, on_batch: Optional[Callable[[List[str]], None]] = None) -> List[str]:
+        """
+        Извлечение passages из датасета с расширенной фильтрацией
 
+        :param on_batch: Вызывается с каждой пачкой из TOKENIZE_BATCH_SIZE очищенных passages по мере чтения датасета
+        """
         try:
-            # Проверяем разные сплиты
-            for split in ['train', 'validation', 'test']:
-                if split in self.dataset:
-                    logger.info(f"Processing '{split}' split")
-
-                    for example in self.dataset[split]:
-                        # Извлекаем положительные passages
-                        if 'positive_passages' in example:
-                            for passage in example['positive_passages']:
-                                if 'text' in passage and passage['text'] not in passage_ids:
-                                    passages.append(passage['text'])
-                                    passage_ids.add(passage['text'])
-
-                        # Извлекаем отрицательные passages
-                        if 'negative_passages' in example:
-                            for passage in example['negative_passages']:
-                                if 'text' in passage and passage['text'] not in passage_ids:
-                                    passages.append(passage['text'])
-                                    passage_ids.add(passage['text'])
+            # Повторы убираются по ходу чтения, порядок первого появления сохраняется;
+            # ключи — ссылки на те же строки, отдельная копия текста для проверки не хранится
+            seen = {}
+            unique_passages = (
+                seen.setdefault(text, text) for text in self._iter_passage_texts() if text not in seen
+            )
+
+            # Очистка и фильтрация passages
+            cleaned = self._clean_passages(unique_passages, on_batch)
 
             # Проверка на наличие passages
-            if not passages:
+            if not seen:
                 logger.error("No passages extracted from dataset")
                 raise NoPassagesError("Не удалось извлечь passages из датасета")
 
-            logger.info(f"Extracted {len(passages)} unique passages")
-
-            # Очистка и фильтрация passages
-            cleaned = self._clean_passages(passages)
+            logger.info(f"Extracted {len(seen)} unique passages")
             logger.info(f"After cleaning: {len(cleaned)} passages")
 
             return cleaned
@@ -178,74 +322,151 @@ class KazQADRetrieval:
             logger.error(f"Error extracting passages: {str(e)}")
             raise
 
-    def _clean_passages(self, passages: List[str]) -> List[str]:
+    def _iter_passage_texts(self):
+        """
+        Тексты положительных и отрицательных passages всех сплитов в порядке датасета
+        """
+        # Проверяем разные сплиты
+        for split in ['train', 'validation', 'test']:
+            if split in self.dataset:
+                logger.info(f"Processing '{split}' split")
+
+                for example in self.dataset[split]:
+                    # Извлекаем положительные, затем отрицательные passages
+                    for field in ('positive_passages', 'negative_passages'):
+                        if field in example:
+                            for passage in example[field]:
+                                if 'text' in passage:
+                                    yield passage['text']
+
+    def _clean_passages(
+            self,
+            passages: Iterable[str],
+            on_batch: Optional[Callable[[List[str]], None]] = None
+    ) -> List[str]:
         """
         Расширенная очистка и фильтрация passages
+
+        Попутно заполняет passage_lengths и passage_kazakh_chars — длины и число казахских букв
+        очищенных passages в массивах int32, параллельных итоговому списку.
+
+        :param passages: Исходные passages (список или поток)
+        :param on_batch: Вызывается с каждой пачкой из TOKENIZE_BATCH_SIZE очищенных passages и с остатком в конце
         """
         cleaned_passages = []
+        lengths = []
+        kazakh_counts = []
         too_short = 0
         no_kazakh = 0
         too_long = 0
 
         for passage in passages:
-            try:
-                # Удаление лишних пробелов и нормализация
-                cleaned = re.sub(r'\s+', ' ', passage).strip()
-
-                # Удаление HTML-тегов, если они есть
-                cleaned = re.sub(r'<[^>]+>', '', cleaned)
-
-                # Удаление слишком коротких пассажей
-                if len(cleaned) < 20:
-                    too_short += 1
-                    continue
-
-                # Проверка на казахские символы
-                kazakh_chars = sum(1 for c in cleaned if c in 'әіңғүұқөһ')
-                if kazakh_chars < 3 and len(cleaned) > 50:
-                    no_kazakh += 1
-                    continue
-
-                # Обрезка слишком длинных passages
-                if len(cleaned) > 1000:
-                    cleaned = cleaned[:1000]
-                    too_long += 1
-
-                cleaned_passages.append(cleaned)
-
-            except Exception as e:
-                logger.warning(f"Error cleaning passage: {str(e)}")
-                # Пропускаем проблемные passages, но продолжаем обработку
+            # Удаление лишних пробелов и нормализация: split() без аргументов делит по тем же
+            # Unicode-пробелам, что и \s, и отбрасывает крайние — тот же результат без regex
+            cleaned = ' '.join(passage.split())
+
+            # Удаление HTML-тегов, если они есть; без '<' регулярное выражение не запускается
+            if '<' in cleaned:
+                cleaned = HTML_TAG_RE.sub('', cleaned)
+
+            # Удаление слишком коротких пассажей
+            if len(cleaned) < 20:
+                too_short += 1
+                continue
+
+            # Проверка на казахские символы
+            kazakh_chars = count_kazakh_chars(cleaned)
+            if kazakh_chars < 3 and len(cleaned) > 50:
+                no_kazakh += 1
+                continue
+
+            # Обрезка слишком длинных passages
+            if len(cleaned) > 1000:
+                cleaned = cleaned[:1000]
+                kazakh_chars = count_kazakh_chars(cleaned)
+                too_long += 1
+
+            cleaned_passages.append(cleaned)
+            lengths.append(len(cleaned))
+            kazakh_counts.append(kazakh_chars)
+            if on_batch is not None and len(cleaned_passages) % TOKENIZE_BATCH_SIZE == 0:
+                on_batch(cleaned_passages[-TOKENIZE_BATCH_SIZE:])
+
+        if on_batch is not None and len(cleaned_passages) % TOKENIZE_BATCH_SIZE:
+            on_batch(cleaned_passages[-(len(cleaned_passages) % TOKENIZE_BATCH_SIZE):])
 
         logger.info(f"Cleaned passages statistics: "
                     f"{too_short} too short, "
                     f"{no_kazakh} without Kazakh chars, "
                     f"{too_long} truncated due to length")
 
+        self.passage_lengths = np.array(lengths, dtype=np.int32)
+        self.passage_kazakh_chars = np.array(kazakh_counts, dtype=np.int32)
         return cleaned_passages
 
     def _tokenize(self, text: str) -> List[str]:
         """
         Токенизация с использованием KazakhTokenizer
         """
+        return tokenize_text(text, self.use_stemming)
+
+    def _extract_and_tokenize_passages(self) -> Tuple[List[str], List[List[str]]]:
+        """
+        Извлечение и токенизация passages конвейером
+
+        Пока датасет читается и очищается, готовые пачки passages уже токенизируются в пуле процессов,
+        так что время построения близко к max(чтение, токенизация), а не к их сумме. Число пачек
+        в работе ограничено TOKENIZE_MAX_PENDING_BATCHES. Первые PARALLEL_TOKENIZE_MIN_PASSAGES
+        passages токенизируются в текущем процессе: для небольшого корпуса пул не запускается.
+        """
+        tokenized = []
+        pending = deque()
+        executor = None
+        parallel = (os.cpu_count() or 1) > 1
+
+        def on_batch(batch: List[str]) -> None:
+            nonlocal executor
+            if executor is None:
+                if not parallel or len(tokenized) < PARALLEL_TOKENIZE_MIN_PASSAGES:
+                    tokenized.extend(tokenize_batch(batch, self.use_stemming))
+                    return
+                executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+            pending.append(executor.submit(tokenize_batch, batch, self.use_stemming))
+            while len(pending) > TOKENIZE_MAX_PENDING_BATCHES:
+                tokenized.extend(pending.popleft().result())
+
         try:
-            return KazakhTokenizer.tokenize(text, apply_stemming=self.use_stemming)
-        except Exception as e:
-            logger.warning(f"Tokenization error: {str(e)}")
-            # В случае ошибки возвращаем простую токенизацию
-            return text.lower().split()
+            passages = self._extract_passages(on_batch)
+            while pending:
+                tokenized.extend(pending.popleft().result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return passages, tokenized
+
+    def _tokenize_to_tuple(self, text: str) -> Tuple[str, ...]:
+        return tuple(self._tokenize(text))
+
+    def _tokenize_query(self, query: str) -> List[str]:
+        """
+        Токенизация запроса с кэшированием
 
-    def _build_inverted_index(self) -> Dict[str, Set[int]]:
+        Ключ кэша нормализуется через strip().lower(): токенизатор и так приводит текст
+        к нижнему регистру и делит по пробелам, поэтому результат не меняется.
         """
-        Создание обратного индекса для быстрого поиска
+        return list(self._tokenize_query_cached(query.strip().lower()))
+
+    def _build_inverted_index(self) -> List[np.ndarray]:
         """
-        inverted_index = {}
+        Создание обратного индекса для быстрого поиска
 
-        for idx, tokens in enumerate(self.tokenized_passages):
-            for token in set(tokens):  # Используем set для уникальности
-                if token not in inverted_index:
-                    inverted_index[token] = set()
-                inverted_index[token].add(idx)
+        Индексируется по id терма (см. BM25Index.vocab). Списки документов — отсортированные int32 срезы
+        CSR-постингов BM25 индекса (без копирования), а не Python set: плотно в памяти и пригодно
+        для векторных объединений и пересечений.
+        """
+        offsets = self.bm25.postings_offsets
+        docids = self.bm25.postings_docid
+        inverted_index = [docids[offsets[t]:offsets[t + 1]] for t in range(len(offsets) - 1)]
 
         logger.info(f"Built inverted index with {len(inverted_index)} unique tokens")
         return inverted_index
@@ -253,33 +474,30 @@ class KazQADRetrieval:
     def _expand_query(self, tokens: List[str]) -> List[str]:
         """
         Расширение запроса синонимами
+
+        Повторы убираются с сохранением порядка: каждый терм скорится по своему списку постингов один раз.
         """
-        expanded = tokens.copy()
+        expanded = dict.fromkeys(tokens)
         for token in tokens:
-            if token in self.KAZAKH_SYNONYMS:
-                expanded.extend(self.KAZAKH_SYNONYMS[token])
-        return expanded
+            for synonym in self.KAZAKH_SYNONYMS.get(token, ()):
+                expanded.setdefault(synonym)
+        return list(expanded)
 
-    def _filter_by_tokens(self, query_tokens: List[str]) -> List[int]:
-        """
-        Быстрая предварительная фильтрация по токенам с использованием обратного индекса
+    def _filter_by_term_ids(self, term_ids: np.ndarray) -> np.ndarray:
         """
-        if not query_tokens:
-            return []
+        Быстрая предварительная фильтрация по id термов запроса с использованием обратного индекса
 
+        Объединение списков документов строится в маске документов: каждый список постингов
+        отмечается одной векторной операцией, без хэширования id через Python set.
+        """
         # Получаем все документы, содержащие хотя бы один токен запроса
-        candidate_docs = set()
-        for token in query_tokens:
-            if token in self.inverted_index:
-                if not candidate_docs:  # Первый токен
-                    candidate_docs = self.inverted_index[token].copy()
-                else:
-                    candidate_docs.update(self.inverted_index[token])
+        candidate_mask = np.zeros(len(self.passages), dtype=bool)
+        for t in term_ids:
+            candidate_mask[self.inverted_index[t]] = True
 
-        return list(candidate_docs)
+        return np.flatnonzero(candidate_mask)
 
-    @lru_cache(maxsize=256)
-    def retrieve(
+    def _retrieve_impl(
             self,
             query: str,
             top_k: Optional[int] = None,
@@ -299,8 +517,8 @@ class KazQADRetrieval:
         start_time = time.time()
         self.query_count += 1
 
-        # Использование значений по умолчанию, если не указаны
-        top_k = top_k or self.top_k
+        # Использование значений по умолчанию, если не указаны (top_k <= 0 — пустой результат)
+        top_k = self.top_k if top_k is None else top_k
         threshold = threshold or self.threshold
 
         logger.info(f"Retrieving passages for query: {query}")
@@ -317,79 +535,93 @@ class KazQADRetrieval:
                 self.cache_hits = cache_info.hits
                 logger.info(f"Cache hit for query: {query}")
 
+        # Токенизация запроса: единственный шаг, зависящий от произвольного пользовательского ввода
         try:
-            # Токенизация запроса
-            query_tokens = self._tokenize(query)
-
-            if len(query_tokens) == 0:
-                logger.warning(f"Query tokenized to empty list: {query}")
-                return []
-
-            # Расширение запроса синонимами
-            if expand_query:
-                expanded_tokens = self._expand_query(query_tokens)
-                logger.info(f"Expanded query from {len(query_tokens)} to {len(expanded_tokens)} tokens")
-            else:
-                expanded_tokens = query_tokens
+            query_tokens = self._tokenize_query(query)
+        except Exception as e:
+            logger.error(f"Error tokenizing query: {str(e)}")
+            self.last_query_time = time.time() - start_time
+            return []
 
-            # Быстрая предфильтрация по токенам
-            candidate_indices = self._filter_by_tokens(expanded_tokens)
+        if len(query_tokens) == 0:
+            logger.warning(f"Query tokenized to empty list: {query}")
+            return []
 
-            if not candidate_indices:
-                logger.info("No candidates found after token filtering")
-                return []
+        # Расширение запроса синонимами
+        if expand_query:
+            expanded_tokens = self._expand_query(query_tokens)
+            logger.info(f"Expanded query from {len(query_tokens)} to {len(expanded_tokens)} tokens")
+        else:
+            expanded_tokens = query_tokens
 
-            # Отладочная информация по кандидатам
-            logger.info(f"Filtered candidates from {len(self.passages)} to {len(candidate_indices)}")
+        # Быстрая предфильтрация по токенам
+        # Токены переводятся в id термов один раз; дальше фильтрация и скоринг работают с int-массивами
+        term_ids = self.bm25.term_ids(expanded_tokens)
+        candidate_indices = self._filter_by_term_ids(term_ids)
 
-            # Получение scores
-            if len(candidate_indices) < len(self.passages):
-                # Используем отфильтрованный набор для скоринга
-                filtered_passages = [self.tokenized_passages[i] for i in candidate_indices]
+        if len(candidate_indices) == 0:
+            logger.info("No candidates found after token filtering")
+            return []
 
-                # Создаем новый BM25 индекс для отфильтрованных пассажей
-                if isinstance(self.bm25, BM25Plus):
-                    temp_bm25 = BM25Plus(filtered_passages)
-                else:
-                    temp_bm25 = BM25Okapi(filtered_passages)
+        # Отладочная информация по кандидатам
+        logger.info(f"Filtered candidates from {len(self.passages)} to {len(candidate_indices)}")
 
-                # Получаем scores
-                scores = temp_bm25.get_scores(expanded_tokens)
+        # top_k по глобальному индексу (IDF всего корпуса) с отсечением MaxScore
+        top_indices, top_scores = self.bm25.top_k(term_ids, top_k, candidate_indices)
+        results = self._format_results(top_indices, top_scores, threshold)
 
-                # Сопоставляем индексы обратно
-                indices_scores = [(candidate_indices[i], score) for i, score in enumerate(scores)]
-            else:
-                # Если фильтрация не помогла, используем полный индекс
-                scores = self.bm25.get_scores(expanded_tokens)
-                indices_scores = [(i, score) for i, score in enumerate(scores)]
-
-            # Debug: print top scores
-            top_scores = sorted(scores, reverse=True)[:5]
-            logger.info(f"Top 5 scores: {top_scores}")
-
-            # Сортировка по score
-            indices_scores.sort(key=lambda x: x[1], reverse=True)
-
-            # Формирование результатов
-            results = []
-            for idx, score in indices_scores[:top_k]:
-                if score >= threshold:
-                    results.append({
-                        'text': self.passages[idx],
-                        'score': float(score),  # Convert numpy float to Python float
-                        'tokens': self.tokenized_passages[idx][:10]  # Первые 10 токенов для примера
-                    })
-
-            # Запись статистики
-            self.last_query_time = time.time() - start_time
+        # Запись статистики
+        self.last_query_time = time.time() - start_time
 
-            logger.info(f"Found {len(results)} passages in {self.last_query_time:.3f} seconds")
-            return results
+        logger.info(f"Found {len(results)} passages in {self.last_query_time:.3f} seconds")
+        return results
 
-        except Exception as e:
-            logger.error(f"Error in retrieve: {str(e)}")
-            self.last_query_time = time.time() - start_time
+    def _rank_candidates(
+            self,
+            scores: np.ndarray,
+            candidate_indices: np.ndarray,
+            top_k: int,
+            threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Выбор top_k кандидатов по scores и формирование результатов
+        """
+        # Не-кандидаты исключаются маской
+        candidate_mask = np.zeros(len(self.passages), dtype=bool)
+        candidate_mask[candidate_indices] = True
+        scores = np.where(candidate_mask, scores, -np.inf)
+
+        # Выбор top_k через argpartition: сортируются только лучшие k, а не весь корпус
+        k = min(top_k, len(candidate_indices))
+        if k <= 0:
+            # argpartition с kth = 0 вернул бы весь массив, а не пустой top
             return []
+        top_indices = np.argpartition(scores, -k)[-k:]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return self._format_results(top_indices, scores[top_indices], threshold)
+
+    def _format_results(
+            self,
+            top_indices: np.ndarray,
+            top_scores: np.ndarray,
+            threshold: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Формирование результатов из отсортированных top_k документов с учетом порога
+        """
+        # Debug: print top scores
+        logger.info(f"Top 5 scores: {top_scores[:5].tolist()}")
+
+        # Формирование результатов
+        results = []
+        for idx, score in zip(top_indices, top_scores):
+            if score >= threshold:
+                results.append({
+                    'text': self.passages[idx],
+                    'score': float(score),  # Convert numpy float to Python float
+                    'tokens': self.tokenized_passages[idx][:10]  # Первые 10 токенов для примера
+                })
+        return results
 
     def query_analysis(self, query: str) -> Dict[str, Any]:
         """
@@ -399,7 +631,7 @@ class KazQADRetrieval:
 
         try:
             # Токенизация запроса
-            tokenized_query = self._tokenize(query)
+            tokenized_query = self._tokenize_query(query)
             expanded_query = self._expand_query(tokenized_query)
 
             # Получение результатов
@@ -414,12 +646,12 @@ class KazQADRetrieval:
                     else:
                         token_frequencies[token] = 1
 
-            # Сортировка токенов по частоте
-            common_tokens = sorted(
+            # 10 самых частых токенов без полной сортировки
+            common_tokens = heapq.nlargest(
+                10,
                 token_frequencies.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:10]
+                key=lambda x: x[1]
+            )
 
             return {
                 'query': query,
@@ -475,7 +707,7 @@ class KazQADRetrieval:
             }
 
             # Статистика по длине passages
-            passage_lengths = [len(p) for p in self.passages]
+            passage_lengths = self.passage_lengths.tolist()
             info['passage_statistics'] = {
                 'min_length': min(passage_lengths) if passage_lengths else 0,
                 'max_length': max(passage_lengths) if passage_lengths else 0,
@@ -484,7 +716,7 @@ class KazQADRetrieval:
             }
 
             # Статистика по токенам
-            token_counts = [len(tokens) for tokens in self.tokenized_passages]
+            token_counts = self.bm25.doc_len.astype(np.int64).tolist()
             info['token_statistics'] = {
                 'min_tokens': min(token_counts) if token_counts else 0,
                 'max_tokens': max(token_counts) if token_counts else 0,
@@ -507,33 +739,31 @@ class KazQADRetrieval:
     ) -> List[Dict[str, Any]]:
         """
         Поиск с дополнительными фильтрами
+
+        Фильтры применяются к кандидатам до ранжирования одной векторной маской
+        по предвычисленным passage_lengths и passage_kazakh_chars.
         """
         try:
-            # Выполнение основного поиска
-            results = self.retrieve(query, top_k=100)  # Получаем больше результатов для фильтрации
+            top_k = self.top_k if top_k is None else top_k
+            query_tokens = self._tokenize_query(query) if query and query.strip() else []
+            term_ids = self.bm25.term_ids(self._expand_query(query_tokens))
+            candidate_indices = self._filter_by_term_ids(term_ids)
 
             # Применение фильтров
-            filtered_results = []
-            for result in results:
-                text = result['text']
-
-                # Фильтр по длине
-                if min_length is not None and len(text) < min_length:
-                    continue
-                if max_length is not None and len(text) > max_length:
-                    continue
-
-                # Фильтр по количеству казахских символов
-                if min_kazakh_chars is not None:
-                    kazakh_chars = sum(1 for c in text if c in 'әіңғүұқөһ')
-                    if kazakh_chars < min_kazakh_chars:
-                        continue
-
-                filtered_results.append(result)
-
-            # Ограничение количества результатов
-            top_k = top_k or self.top_k
-            return filtered_results[:top_k]
+            mask = np.ones(len(candidate_indices), dtype=bool)
+            lengths = self.passage_lengths[candidate_indices]
+            # Фильтр по длине
+            if min_length is not None:
+                mask &= lengths >= min_length
+            if max_length is not None:
+                mask &= lengths <= max_length
+            # Фильтр по количеству казахских символов
+            if min_kazakh_chars is not None:
+                mask &= self.passage_kazakh_chars[candidate_indices] >= min_kazakh_chars
+            candidate_indices = candidate_indices[mask]
+
+            top_indices, top_scores = self.bm25.top_k(term_ids, top_k, candidate_indices)
+            return self._format_results(top_indices, top_scores, self.threshold)
         except Exception as e:
             logger.error(f"Error in search_with_filters: {str(e)}")
             return []
@@ -549,17 +779,22 @@ class KazQADRetrieval:
             # Используем текст passage как запрос
             passage_text = self.passages[passage_id]
 
-            # Получаем токены исходного passage
-            source_tokens = self.tokenized_passages[passage_id]
+            # Получаем токены исходного passage сразу как id термов
+            offsets = self.bm25.doc_offsets
+            source_ids = self.bm25.doc_tokens[offsets[passage_id]:offsets[passage_id + 1]]
 
             # Получаем scores для всех passages
-            scores = self.bm25.get_scores(source_tokens)
+            scores = self.bm25.get_scores_for_ids(source_ids)
 
             # Устанавливаем score исходного passage в 0, чтобы он не попал в результаты
             scores[passage_id] = 0
 
-            # Сортировка и выбор top_k passages
-            top_indices = np.argsort(scores)[-top_k:][::-1]
+            # Выбор top_k passages через argpartition, сортируются только они
+            k = min(top_k, len(scores))
+            if k <= 0:
+                return []
+            top_indices = np.argpartition(scores, -k)[-k:]
+            top_indices = top_indices[np.argsort(-scores[top_indices])]
 
             results = [
                 {
@@ -575,14 +810,67 @@ class KazQADRetrieval:
             logger.error(f"Error in get_similar_passages: {str(e)}")
             return []
 
-    def batch_retrieve(self, queries: List[str], top_k: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+    def batch_retrieve(
+            self,
+            queries: List[str],
+            top_k: int = 5,
+            batch_size: int = 64,
+            workers: int = 1
+    ) -> Dict[str, List[Dict[str, Any]]]:
         """
         Пакетный поиск для нескольких запросов
+
+        Запросы скорятся пачками по batch_size одним умножением разреженной матрицы
+        запросов на предвычисленные BM25 веса вместо отдельного retrieve на каждый запрос.
+        При workers > 1 пачки распределяются по процессам, которые открывают индекс
+        из дискового кэша через mmap; в задачу передаются только id термов запросов.
         """
+        start_time = time.time()
+        self.query_count += len(queries)
+
         results = {}
-        for query in queries:
-            results[query] = self.retrieve(query, top_k=top_k)
-        return results
+        pending = []
+        for query in dict.fromkeys(queries):
+            query_tokens = self._tokenize_query(query) if query and query.strip() else []
+            term_ids = self.bm25.term_ids(self._expand_query(query_tokens))
+            if workers > 1 and self.index_dir is not None:
+                if len(term_ids) > 0:
+                    pending.append((query, term_ids, None))
+                else:
+                    results[query] = []
+                continue
+            candidate_indices = self._filter_by_term_ids(term_ids)
+            if len(candidate_indices) > 0:
+                pending.append((query, term_ids, candidate_indices))
+            else:
+                results[query] = []
+
+        if workers > 1 and self.index_dir is not None:
+            batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_init_batch_worker,
+                    initargs=(self.index_dir,)
+            ) as executor:
+                batch_results = executor.map(
+                    partial(_top_k_batch_worker, top_k=top_k),
+                    [[term_ids for _, term_ids, _ in batch] for batch in batches]
+                )
+                for batch, top in zip(batches, batch_results):
+                    for (query, _, _), (top_indices, top_scores) in zip(batch, top):
+                        results[query] = self._format_results(top_indices, top_scores, self.threshold)
+        else:
+            if workers > 1:
+                logger.warning("Index cache is disabled, batch_retrieve runs in a single process")
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i:i + batch_size]
+                batch_scores = self.bm25.get_scores_batch([term_ids for _, term_ids, _ in batch])
+                for (query, _, candidate_indices), scores in zip(batch, batch_scores):
+                    results[query] = self._rank_candidates(scores, candidate_indices, top_k, self.threshold)
+
+        self.last_query_time = time.time() - start_time
+        logger.info(f"Batch retrieved {len(queries)} queries in {self.last_query_time:.3f} seconds")
+        return {query: results[query] for query in queries}
 
 
 def main():
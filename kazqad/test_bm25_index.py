@@ -0,0 +1,145 @@
+import math
+import tempfile
+import unittest
+
+import numpy as np
+
+from bm25_index import BM25Index
+
+
+# Small synthetic corpus: 'a' occurs almost everywhere (negative IDF in Okapi),
+# some terms repeat inside documents and document lengths differ
+CORPUS = [
+    ['a', 'b', 'c', 'a'],
+    ['a', 'd'],
+    ['a', 'b', 'b', 'b', 'e', 'f'],
+    ['c', 'e'],
+    ['a', 'f', 'g', 'a', 'a'],
+    ['a', 'h'],
+    ['b', 'c', 'd', 'e', 'f', 'g', 'h'],
+]
+
+QUERIES = [
+    ['b'],
+    ['a', 'c'],
+    ['b', 'b', 'e'],
+    ['a', 'a', 'g', 'h', 'x'],
+    ['x'],
+]
+
+
+def reference_scores(corpus, query, variant, k1=1.5, b=0.75, delta=1.0, epsilon=0.25):
+    """Scores by the textbook BM25+ / Okapi formulas (same constants as rank_bm25)"""
+    n_docs = len(corpus)
+    avgdl = sum(len(doc) for doc in corpus) / n_docs
+    doc_freq = {}
+    for doc in corpus:
+        for token in set(doc):
+            doc_freq[token] = doc_freq.get(token, 0) + 1
+
+    if variant == 'plus':
+        idf = {token: math.log((n_docs + 1) / df) for token, df in doc_freq.items()}
+    else:
+        idf = {token: math.log(n_docs - df + 0.5) - math.log(df + 0.5) for token, df in doc_freq.items()}
+        average_idf = sum(idf.values()) / len(idf)
+        idf = {token: value if value >= 0 else epsilon * average_idf for token, value in idf.items()}
+
+    scores = []
+    for doc in corpus:
+        norm = k1 * (1 - b + b * len(doc) / avgdl)
+        score = 0.0
+        for token in query:
+            if token not in idf:
+                continue
+            tf = doc.count(token)
+            term = tf * (k1 + 1) / (tf + norm)
+            score += idf[token] * (term + delta if variant == 'plus' else term)
+        scores.append(score)
+    return np.array(scores)
+
+
+class TestBM25Index(unittest.TestCase):
+    """Tests for the BM25Index class on a small synthetic corpus"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.indexes = {variant: BM25Index(CORPUS, variant=variant) for variant in ('plus', 'classic')}
+
+    def candidates(self, index, term_ids):
+        """Sorted ids of documents containing at least one query term"""
+        docs = [index.postings_docid[index.postings_offsets[t]:index.postings_offsets[t + 1]] for t in term_ids]
+        return np.unique(np.concatenate(docs)) if docs else np.empty(0, dtype=np.int32)
+
+    def test_get_scores_matches_formulas(self):
+        """Test get_scores against BM25+ and Okapi formulas, including repeated and unknown terms"""
+        for variant, index in self.indexes.items():
+            for query in QUERIES:
+                with self.subTest(variant=variant, query=query):
+                    np.testing.assert_allclose(
+                        index.get_scores(query), reference_scores(CORPUS, query, variant), rtol=1e-5, atol=1e-6
+                    )
+
+    def test_top_k_matches_full_ranking(self):
+        """Test top_k against the ranking of get_scores, including k larger than the candidate count"""
+        for variant, index in self.indexes.items():
+            for query in QUERIES:
+                term_ids = index.term_ids(query)
+                candidates = self.candidates(index, term_ids)
+                full = index.get_scores_for_ids(term_ids)
+                for k in (1, 2, 3, len(CORPUS) + 5):
+                    with self.subTest(variant=variant, query=query, k=k):
+                        docs, scores = index.top_k(term_ids, k, candidates)
+                        self.assertEqual(len(docs), min(k, len(candidates)))
+                        self.assertTrue(set(docs.tolist()) <= set(candidates.tolist()))
+                        # Scores match full scoring and are in descending order
+                        np.testing.assert_allclose(scores, full[docs], rtol=1e-5, atol=1e-6)
+                        self.assertTrue(np.all(np.diff(scores) <= 1e-6))
+                        # These are the best k candidates (up to ties)
+                        expected = np.sort(full[candidates])[::-1][:len(docs)]
+                        np.testing.assert_allclose(scores, expected, rtol=1e-5, atol=1e-6)
+
+    def test_top_k_empty(self):
+        """Test top_k returns nothing for k <= 0 or no candidates"""
+        index = self.indexes['plus']
+        term_ids = index.term_ids(['b'])
+        docs, scores = index.top_k(term_ids, 0, self.candidates(index, term_ids))
+        self.assertEqual(len(docs), 0)
+        self.assertEqual(len(scores), 0)
+        docs, scores = index.top_k(index.term_ids(['x']), 5, np.empty(0, dtype=np.int32))
+        self.assertEqual(len(docs), 0)
+
+    def test_get_scores_batch_matches_get_scores(self):
+        """Test get_scores_batch against stacked get_scores"""
+        for variant, index in self.indexes.items():
+            with self.subTest(variant=variant):
+                queries = [index.term_ids(query) for query in QUERIES]
+                expected = np.stack([index.get_scores_for_ids(term_ids) for term_ids in queries])
+                batch = index.get_scores_batch(queries)
+                self.assertEqual(batch.shape, (len(QUERIES), len(CORPUS)))
+                np.testing.assert_allclose(batch, expected, rtol=1e-5, atol=1e-6)
+                self.assertEqual(index.get_scores_batch([]).shape, (0, len(CORPUS)))
+
+    def test_save_load_round_trip(self):
+        """Test that a saved and loaded index gives the same scores"""
+        for variant, index in self.indexes.items():
+            with self.subTest(variant=variant), tempfile.TemporaryDirectory() as path:
+                index.save(path)
+                for mmap_mode in ('r', None):
+                    loaded = BM25Index.load(path, mmap_mode=mmap_mode)
+                    self.assertEqual(loaded.vocab, index.vocab)
+                    self.assertEqual(loaded.variant, index.variant)
+                    self.assertEqual(loaded.n_docs, index.n_docs)
+                    self.assertAlmostEqual(loaded.avgdl, index.avgdl)
+                    for query in QUERIES:
+                        np.testing.assert_array_equal(loaded.get_scores(query), index.get_scores(query))
+                    term_ids = loaded.term_ids(QUERIES[1])
+                    docs, scores = loaded.top_k(term_ids, 3, self.candidates(loaded, term_ids))
+                    expected_docs, expected_scores = index.top_k(term_ids, 3, self.candidates(index, term_ids))
+                    np.testing.assert_array_equal(docs, expected_docs)
+                    np.testing.assert_array_equal(scores, expected_scores)
+                    # Memory-mapped arrays must be released before the directory is removed
+                    del loaded
+
+
+if __name__ == '__main__':
+    unittest.main()
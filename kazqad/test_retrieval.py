@@ -3,31 +3,27 @@ import sys
 from kazqad_retrieval import KazQADRetrieval
 from tokenizer import KazakhTokenizer
 
+# Ensure stdout is properly configured for Windows
+if sys.platform == 'win32' and hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8', errors='replace')
+    sys.stderr.reconfigure(encoding='utf-8', errors='replace')
+
 
 class TestKazQADRetrieval(unittest.TestCase):
     """Tests for the KazQADRetrieval class"""
 
-    # Create a shared retrieval instance to speed up tests
-    # This avoids the need for setUp/tearDown methods
-    try:
-        # Ensure stdout is properly configured for Windows
-        if sys.platform == 'win32':
-            import io
-            sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-            sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
-
-        retrieval = KazQADRetrieval(threshold=0.1)
+    @classmethod
+    def setUpClass(cls):
+        """Create one shared retrieval instance for all tests; initialization errors fail the tests"""
+        cls.retrieval = KazQADRetrieval(threshold=0.1)
 
         # Set up test queries
-        test_queries = [
+        cls.test_queries = [
             "Қазақстан тарихы",
             "Абай Құнанбаев",
             "Қазақстан астанасы",
             "Алматы қаласы"
         ]
-    except Exception as e:
-        print(f"Error initializing retrieval system: {e}")
-        retrieval = None
 
     def test_initialization(self):
         """Test that retrieval system initializes correctly"""
@@ -38,9 +34,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_dataset_info(self):
         """Test dataset info method returns correct information"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         info = self.retrieval.dataset_info()
 
         self.assertIn('total_passages', info)
@@ -54,9 +47,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_basic_retrieval(self):
         """Test basic retrieval functionality"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         query = self.test_queries[0]  # Use first query
         results = self.retrieval.retrieve(query, threshold=0.1)
 
@@ -91,9 +81,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_empty_query(self):
         """Test that empty queries return empty results"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         results = self.retrieval.retrieve("")
         self.assertEqual(len(results), 0)
 
@@ -102,9 +89,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_query_analysis(self):
         """Test query analysis functionality"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         query = self.test_queries[0]
         analysis = self.retrieval.query_analysis(query)
 
@@ -121,9 +105,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_search_with_filters(self):
         """Test search with additional filters"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         query = "Қазақстан"
 
         # Get regular results
@@ -139,9 +120,6 @@ class TestKazQADRetrieval(unittest.TestCase):
 
     def test_different_threshold(self):
         """Test retrieval with different thresholds"""
-        if not self.retrieval:
-            self.skipTest("Retrieval system not initialized")
-
         query = self.test_queries[0]
 
         # Get results with low threshold
@@ -1,25 +1,68 @@
 import re
 import unicodedata
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable
+
+# Версия результата токенизации: увеличивается при любом изменении токенов на выходе
+# (нормализация, пунктуация, стоп-слова, стемминг); входит в ключ дискового кэша индекса
+TOKENIZER_VERSION = 1
+
+# Пунктуация и специальные символы; шаблон компилируется один раз, а не разбирается при каждом вызове
+PUNCTUATION_RE = re.compile(r'[^\w\sәіңғүұқөһ\-]')
+
+
+class _StripDiacriticsTable(dict):
+    """
+    Таблица для str.translate: код символа -> его NFKD-разложение без диакритических знаков (Mn)
+
+    Заполняется лениво по мере появления новых символов, поэтому повторные символы переводятся
+    одним C-проходом translate без вызова unicodedata.category на каждый символ текста.
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        stripped = ''.join(
+            char for char in unicodedata.normalize('NFKD', chr(codepoint))
+            if unicodedata.category(char) != 'Mn'
+        )
+        self[codepoint] = stripped
+        return stripped
+
+
+STRIP_DIACRITICS = _StripDiacriticsTable()
+
+
+def _group_suffixes_by_length(suffixes):
+    """
+    Суффиксы, сгруппированные по длине от длинных к коротким: ((длина, frozenset суффиксов), ...)
+    """
+    lengths = sorted({len(suffix) for suffix in suffixes}, reverse=True)
+    return tuple((length, frozenset(s for s in suffixes if len(s) == length)) for length in lengths)
 
 
 class KazakhTokenizer:
-    KAZAKH_STOPWORDS = {
+    KAZAKH_STOPWORDS = frozenset({
         'бұл', 'сол', 'мен', 'сен', 'ол', 'біз', 'сіз',
         'және', 'өте', 'тек', 'содан', 'сонда'
-    }
+    })
 
-    KAZAKH_SUFFIXES = [
+    # Порядок важен: суффиксы проверяются от длинных к коротким, срабатывает первый подходящий
+    KAZAKH_SUFFIXES = (
         'лар', 'лер', 'дар', 'дер',
         'тар', 'тер', 'шыл', 'шіл',
         'мен', 'бен', 'пен',
         'да', 'де', 'та', 'те'
-    ]
+    )
 
-    STEMMING_EXCEPTIONS = [
+    # Для стемминга: окончание токена каждой длины проверяется одним поиском в множестве,
+    # а не перебором всех суффиксов через endswith
+    SUFFIXES_BY_LENGTH = _group_suffixes_by_length(KAZAKH_SUFFIXES)
+
+    # Специфичные казахские буквы; проверка токена - frozenset.isdisjoint на уровне C
+    KAZAKH_CHARS = frozenset('әіңғүұқөһ')
+
+    STEMMING_EXCEPTIONS = frozenset({
         'әріптер', 'нүктелер', 'үтірлер',
         'тілінде', 'кітаптар', 'адамдар'
-    ]
+    })
 
     @classmethod
     def normalize_text(cls, text: str) -> str:
@@ -29,11 +72,8 @@ class KazakhTokenizer:
         # Привести к нижнему регистру
         text = text.lower()
 
-        # Удаление диакритических знаков
-        text = ''.join(
-            char for char in unicodedata.normalize('NFKD', text)
-            if unicodedata.category(char) != 'Mn'
-        )
+        # Удаление диакритических знаков (NFKD посимвольно с отбрасыванием Mn, через кэш по символам)
+        text = text.translate(STRIP_DIACRITICS)
 
         return text
 
@@ -46,34 +86,40 @@ class KazakhTokenizer:
     ) -> List[str]:
         """
         Токенизация с расширенной обработкой казахских символов
+
+        Не кэшируется: повторные запросы кэширует KazQADRetrieval (_tokenize_query_cached).
         """
-        # Нормализация
-        text = cls.normalize_text(text)
-
-        # Очистка от пунктуации и специальных символов
-        text = re.sub(
-            r'[^\w\sәіңғүұқөһ\-]',
-            ' ',
-            text
-        )
+        return cls.tokenize_batch((text,), remove_stopwords, apply_stemming)[0]
 
-        # Токенизация
-        tokens = text.split()
+    @classmethod
+    def tokenize_batch(
+            cls,
+            texts: Iterable[str],
+            remove_stopwords: bool = False,
+            apply_stemming: bool = False
+    ) -> List[List[str]]:
+        """
+        Токенизация набора текстов без кэширования (для корпуса passages, где тексты не повторяются);
+        шаблон, стоп-слова и стемминг связываются один раз, а не на каждый текст
+        """
+        strip_punctuation = PUNCTUATION_RE.sub
+        stopwords = cls.KAZAKH_STOPWORDS
+        stem = cls._stem_token
+        result = []
+        for text in texts:
+            # Нормализация (как normalize_text), очистка от пунктуации и специальных символов, токенизация
+            tokens = strip_punctuation(' ', text.lower().translate(STRIP_DIACRITICS)).split()
 
-        # Удаление стоп-слов
-        if remove_stopwords:
-            tokens = [
-                token for token in tokens
-                if token not in cls.KAZAKH_STOPWORDS
-            ]
+            # Удаление стоп-слов
+            if remove_stopwords:
+                tokens = [token for token in tokens if token not in stopwords]
 
-        # Стемминг
-        if apply_stemming:
-            tokens = [
-                cls._stem_token(token) for token in tokens
-            ]
+            # Стемминг
+            if apply_stemming:
+                tokens = [stem(token) for token in tokens]
 
-        return tokens
+            result.append(tokens)
+        return result
 
     @classmethod
     def _stem_token(cls, token: str) -> str:
@@ -84,12 +130,10 @@ class KazakhTokenizer:
         if token in cls.STEMMING_EXCEPTIONS:
             return token
 
-        # Удаление суффиксов
-        for suffix in cls.KAZAKH_SUFFIXES:
-            if (token.endswith(suffix) and
-                    len(token) > len(suffix) + 2):
-                token = token[:-len(suffix)]
-                break
+        # Удаление суффиксов: самый длинный подходящий, если после него остается больше двух символов
+        for length, suffixes in cls.SUFFIXES_BY_LENGTH:
+            if len(token) > length + 2 and token[-length:] in suffixes:
+                return token[:-length]
 
         return token
 
@@ -98,12 +142,13 @@ class KazakhTokenizer:
         """
         Получение метрик для набора токенов
         """
+        kazakh_chars = cls.KAZAKH_CHARS
         return {
             'total_tokens': len(tokens),
             'unique_tokens': len(set(tokens)),
             'avg_token_length': sum(len(t) for t in tokens) / len(tokens) if tokens else 0,
             'kazakh_char_tokens': sum(
                 1 for token in tokens
-                if any(char in 'әіңғүұқөһ' for char in token)
+                if not kazakh_chars.isdisjoint(token)
             )
         }
\ No newline at end of file
@@ -86,6 +86,28 @@ async def demonstrate_search_approaches():
         print("\n3. Hybrid Search Results:")
         query_embedding = llm.get_embedding(query)
 
+        # The weight sweep in section 5 is independent of this search: start its
+        # Elasticsearch requests now so they run concurrently with the one below
+        weight_combinations = [
+            (0.8, 0.2),  # Favor text matching
+            (0.2, 0.8),  # Favor semantic similarity
+            (0.5, 0.5),  # Equal weights
+        ]
+        weight_sweep = asyncio.gather(
+            *(
+                hybrid_repo.hybrid_search(
+                    query=query,
+                    query_vector=query_embedding,
+                    weight_text=text_weight,
+                    weight_vector=vector_weight,
+                    size=3,
+                    return_raw_es=True,
+                    fusion="linear",
+                )
+                for text_weight, vector_weight in weight_combinations
+            )
+        )
+
         try:
             hybrid_results = await hybrid_repo.hybrid_search(
                 query=query,
@@ -127,22 +149,10 @@ async def demonstrate_search_approaches():
         # 5. Experiment with different weights
         # --------------------------------------------------------------
         print("\n=== Testing Different Hybrid Weights ===")
-        weight_combinations = [
-            (0.8, 0.2),  # Favor text matching
-            (0.2, 0.8),  # Favor semantic similarity
-            (0.5, 0.5),  # Equal weights
-        ]
+        weight_results = await weight_sweep
 
-        for text_weight, vector_weight in weight_combinations:
+        for (text_weight, vector_weight), results in zip(weight_combinations, weight_results):
             print(f"\nWeights - Text: {text_weight:.1f}, Vector: {vector_weight:.1f}")
-            results = await hybrid_repo.hybrid_search(
-                query=query,
-                query_vector=query_embedding,
-                weight_text=text_weight,
-                weight_vector=vector_weight,
-                size=3,
-                return_raw_es=True,
-            )
             for i, result in enumerate(results, 1):
                 result_id = result.get("_id") if isinstance(result, dict) else result.id
                 content = (
@@ -1,16 +1,15 @@
-import io
 import sys
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-#Обеспечивает корректный вывод казахских символов в консоли Windows.
-import requests # отправка POST-запросов.
+sys.stdout.reconfigure(encoding='utf-8')
+#Обеспечивает корректный вывод казахских символов в консоли Windows (поток перенастраивается на месте, без новой обертки).
+import asyncio
+import aiohttp # асинхронная отправка POST-запросов
 import argparse # разбор аргументов командной строки
 import logging # логирование
 import time
-import json
+import orjson # быстрая сериализация JSON (кириллица кодируется без экранирования)
 from datasets import load_dataset # загрузка KazQAD с HuggingFace
 from tqdm import tqdm # визуальный прогрессбар
 import uuid # генерация ID и времени
-from datetime import datetime
 
 
 # Настройка логгера
@@ -19,7 +18,7 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s', #формат сообщений лога (время - уровень - сообщение)
     handlers=[  #Два обработчика
         logging.FileHandler("kazqad_test.log"), #В файл kazqad_test.log
-        logging.StreamHandler(stream=io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')) #В консоль (в UTF-8, чтобы не крашилась)
+        logging.StreamHandler(sys.stdout) #В консоль — тот же UTF-8 поток, что и print
     ]
 )
 logger = logging.getLogger(__name__) #создание объекта логгера для текущего модуля
@@ -41,90 +40,123 @@ def load_kazqad_dataset(split="test", limit=None): #split раздел дата
         logger.error(f"Failed to load dataset: {e}")
         raise
 
+def make_passage_extractor(dataset, field):
+    """Detect once how passages are stored in `field` and return a matching text extractor"""
+    # Схема датасета одинакова для всех элементов: проверяем первый непустой список, а не каждый элемент
+    for item in dataset:
+        passages = item[field]
+        if len(passages) > 0:
+            # Если это список словарей, извлекаем только текст
+            if isinstance(passages[0], dict) and "text" in passages[0]:
+                return lambda passages: [p["text"] for p in passages]
+            break
+    return list
+
+
+def build_payload(item, timestamp, ticket_id, extract_positive, extract_negative):
+    """Build the /events request body for a dataset item"""
+    # Формируем запрос в соответствии с ожидаемой структурой / Этот JSON будет отправлен в /events
+    return {
+        "query_id": item["query_id"],
+        "query": item["query"],
+        "positive": extract_positive(item["positive_passages"]),
+        "negative": extract_negative(item["negative_passages"]),
+        "ticket_id": ticket_id,
+        "timestamp": timestamp,
+        "from_email": "user@example.com",
+        # Вот здесь меняем на допустимый email
+        "to_email": "support@example.com",
+        "sender": "KazQAD Test",
+        "subject": f"Query: {item['query_id']}",
+        "body": item["query"]
+    }
+
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Все неудачные запросы построчно пишутся в JSONL-файл; в памяти для итоговой сводки остаются только первые
+FAILED_ITEMS_FILE = "kazqad_failed.jsonl"
+FAILED_ITEMS_SHOWN = 10
+
+
 # Основная функция тестирования
-def test_retrieval_system(dataset, api_url, batch_size=1, delay=0.1):
-    """Test the retrieval system with the KazQAD dataset"""
-    #Инициализация счётчиков
+async def test_retrieval_system(dataset, api_url, batch_size=1, delay=0.0, concurrency=16):
+    """Test the retrieval system with the KazQAD dataset, keeping up to `concurrency` requests in flight"""
+    #Инициализация счётчиков (корутины выполняются в одном потоке, поэтому блокировки не нужны)
     results = {
         "total": len(dataset),
         "successful": 0,
         "failed": 0,
         "failed_items": []
     }
+    # Время запуска теста — общее для всех запросов; uuid4 связывается локально
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    uuid4 = uuid.uuid4
+    extract_positive = make_passage_extractor(dataset, "positive_passages")
+    extract_negative = make_passage_extractor(dataset, "negative_passages")
+    total = len(dataset)
+    semaphore = asyncio.Semaphore(concurrency)
+    # Прогрессбар перерисовывается не чаще раза в секунду, а не на каждый ответ
+    progress = tqdm(total=total, desc="Testing queries", mininterval=1.0)
+    done = 0
+
+    def record_failure(error_info):
+        results["failed"] += 1
+        if len(results["failed_items"]) < FAILED_ITEMS_SHOWN:
+            results["failed_items"].append(error_info)
+        failed_file.write(orjson.dumps(error_info) + b"\n")
 
-    for i, item in enumerate(tqdm(dataset, desc="Testing queries")): #Обработка каждого элемента датасета
-        # Проверяем структуру positive_passages и negative_passages
-        if len(item["positive_passages"]) > 0:
-            # Если это список словарей, извлекаем только текст
-            if isinstance(item["positive_passages"][0], dict) and "text" in item["positive_passages"][0]:
-                positive = [p["text"] for p in item["positive_passages"]]
-            else:
-                positive = item["positive_passages"]
-        else:
-            positive = []
-
-        if len(item["negative_passages"]) > 0:
-            # Если это список словарей, извлекаем только текст
-            if isinstance(item["negative_passages"][0], dict) and "text" in item["negative_passages"][0]:
-                negative = [n["text"] for n in item["negative_passages"]]
-            else:
-                negative = item["negative_passages"]
-        else:
-            negative = []
-
-        # Формируем запрос в соответствии с ожидаемой структурой / Формирование JSON-запроса / Этот JSON будет отправлен в /events
-        data = {
-            "query_id": item["query_id"],
-            "query": item["query"],
-            "positive": positive,
-            "negative": negative,
-            "ticket_id": str(uuid.uuid4()),
-            "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "from_email": "user@example.com",
-            # Вот здесь меняем на допустимый email
-            "to_email": "support@example.com",
-            "sender": "KazQAD Test",
-            "subject": f"Query: {item['query_id']}",
-            "body": item["query"]
-        }
+    async def send(session, i, item):
+        nonlocal done
+        data = build_payload(item, timestamp, uuid4().hex, extract_positive, extract_negative)
+        body = orjson.dumps(data)
 
         # Добавим отладочную информацию
         if i == 0:  # Только для первого запроса
-            logger.info(f"Sample request data: {json.dumps(data, ensure_ascii=False)[:500]}...")
-
-        try:
-            # Отправляем запрос к API
-            response = requests.post(api_url, json=data, timeout=30) # API должен вернуть 202 или 200
-            #В случае ошибки — логируется и сохраняется query_id, код и тело ответа
-            if response.status_code in [200, 202]: #Отправка POST-запроса / Проверка результата
-                results["successful"] += 1
-                logger.debug(f"Item {i + 1}/{len(dataset)}: Success")
-            else:
-                results["failed"] += 1
+            logger.info(f"Sample request data: {body.decode()[:500]}...")
+
+        async with semaphore:
+            try:
+                # Отправляем запрос к API
+                async with session.post(api_url, data=body, headers=JSON_HEADERS) as response: # API должен вернуть 202 или 200
+                    #В случае ошибки — логируется и сохраняется query_id, код и тело ответа
+                    if response.status in [200, 202]: #Проверка результата
+                        results["successful"] += 1
+                        logger.debug(f"Item {i + 1}/{total}: Success")
+                    else:
+                        text = await response.text()
+                        error_info = {
+                            "query_id": item["query_id"],
+                            "status_code": response.status,
+                            "response": text[:100] + "..." if len(text) > 100 else text
+                        }
+                        record_failure(error_info)
+                        logger.warning(f"Item {i + 1}/{total}: Failed with status {response.status}")
+            #Если запрос упал с ошибкой соединения, таймаутом и т.п
+            except Exception as e:
                 error_info = {
                     "query_id": item["query_id"],
-                    "status_code": response.status_code,
-                    "response": response.text[:100] + "..." if len(response.text) > 100 else response.text
+                    "exception": str(e)
                 }
-                results["failed_items"].append(error_info)
-                logger.warning(f"Item {i + 1}/{len(dataset)}: Failed with status {response.status_code}")
-        #Если requests.post упал с ошибкой соединения и т.п
-        except Exception as e:
-            results["failed"] += 1
-            error_info = {
-                "query_id": item["query_id"],
-                "exception": str(e)
-            }
-            results["failed_items"].append(error_info)
-            logger.error(f"Item {i + 1}/{len(dataset)}: Exception - {e}")
+                record_failure(error_info)
+                logger.error(f"Item {i + 1}/{total}: Exception - {e}")
 
-        # Добавляем задержку между запросами
-        if delay > 0 and i < len(dataset) - 1:
-            time.sleep(delay)
+            # Необязательная задержка для ограничения скорости: держит слот семафора
+            if delay > 0:
+                await asyncio.sleep(delay)
 
+        done += 1
+        progress.update(1)
         # Логируем прогресс каждые batch_size элементов
-        if (i + 1) % batch_size == 0:
-            logger.info(f"Progress: {i + 1}/{len(dataset)} items processed")
+        if done % batch_size == 0:
+            logger.info(f"Progress: {done}/{total} items processed")
+
+    timeout = aiohttp.ClientTimeout(total=30)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    with open(FAILED_ITEMS_FILE, "wb") as failed_file:
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await asyncio.gather(*(send(session, i, item) for i, item in enumerate(dataset)))
+    progress.close()
 
     return results
 
@@ -141,7 +173,7 @@ def print_summary(results): # Вывод итогов
 
     if results["failed_items"]:
         logger.info("\nFailed Items:")
-        for item in results["failed_items"][:10]:  # Show first 10 failures
+        for item in results["failed_items"]:  # Show first FAILED_ITEMS_SHOWN failures
             logger.info(f"- Query ID: {item['query_id']}")
             if "status_code" in item:
                 logger.info(f"  Status: {item['status_code']}")
@@ -149,8 +181,8 @@ def print_summary(results): # Вывод итогов
             else:
                 logger.info(f"  Exception: {item['exception']}")
 
-        if len(results["failed_items"]) > 10:
-            logger.info(f"... and {len(results['failed_items']) - 10} more failures (see log file)")
+        if results["failed"] > len(results["failed_items"]):
+            logger.info(f"... and {results['failed'] - len(results['failed_items'])} more failures (see {FAILED_ITEMS_FILE})")
 
 
 def main():
@@ -163,8 +195,10 @@ def main():
                         help="Dataset split to use (default: test)")
     parser.add_argument("--batch-size", type=int, default=10,
                         help="Log progress every N items (default: 10)")
-    parser.add_argument("--delay", type=float, default=0.1,
-                        help="Delay between requests in seconds (default: 0.1)")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Delay after each request per concurrent slot, for rate limiting (default: 0)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Number of requests in flight (default: 16)")
 
     args = parser.parse_args()
 
@@ -173,18 +207,20 @@ def main():
     logger.info(f"Dataset split: {args.split}")
     logger.info(f"Item limit: {args.limit if args.limit else 'None (using all items)'}")
     logger.info(f"Request delay: {args.delay} seconds")
+    logger.info(f"Concurrency: {args.concurrency}")
 
     # Load the dataset
     dataset = load_kazqad_dataset(split=args.split, limit=args.limit)
 
     # Run the test
     start_time = time.time()
-    results = test_retrieval_system(
+    results = asyncio.run(test_retrieval_system(
         dataset,
         args.api_url,
         batch_size=args.batch_size,
-        delay=args.delay
-    )
+        delay=args.delay,
+        concurrency=args.concurrency
+    ))
     end_time = time.time()
 
     # Print summary
@@ -1,21 +1,29 @@
-import io
 import sys
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import argparse
 import logging
 import time
-import json
+import orjson # быстрая сериализация JSON (кириллица кодируется без экранирования)
 import numpy as np
+import torch
 from datasets import load_dataset
 from tqdm import tqdm
 import uuid
-from datetime import datetime
-from sklearn.metrics.pairwise import cosine_similarity
+from functools import lru_cache
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sentence_transformers import SentenceTransformer
 
-# Обеспечиваем корректный вывод символов в консоли Windows
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+# Обеспечиваем корректный вывод символов в консоли Windows (потоки перенастраиваются на месте, без новой обертки)
+sys.stdout.reconfigure(encoding='utf-8')
+sys.stderr.reconfigure(encoding='utf-8')
 
 # Настройка логгера
 logging.basicConfig(
@@ -23,11 +31,20 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("kazqad_test.log"),
-        logging.StreamHandler(stream=io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8'))
+        logging.StreamHandler(sys.stdout)  # тот же UTF-8 поток, что и print
     ]
 )
 logger = logging.getLogger(__name__)
 
+# Одна сессия на все запросы: TCP-соединения к API переиспользуются (keep-alive), а не открываются на каждый запрос
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.1))
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+# Размер батча для model.encode: все запросы и passages кодируются несколькими крупными вызовами
+ENCODE_BATCH_SIZE = 64
+
 
 # Функция загрузки датасета
 def load_kazqad_dataset(split="test", limit=None):
@@ -46,6 +63,53 @@ def load_kazqad_dataset(split="test", limit=None):
         raise
 
 
+def make_passage_extractor(dataset, field):
+    """Detect once how passages are stored in `field` and return a matching text extractor"""
+    # Схема датасета одинакова для всех элементов: проверяем первый непустой список, а не каждый элемент
+    for item in dataset:
+        passages = item[field]
+        if len(passages) > 0:
+            # Если это список словарей, извлекаем только текст
+            if isinstance(passages[0], dict) and "text" in passages[0]:
+                return lambda passages: [p["text"] for p in passages]
+            break
+    return list
+
+
+# Ранг первого положительного пассажа для каждого запроса
+def first_positive_ranks(similarities, positive_indices_list):
+    """
+    Рассчитывает для каждого запроса ранг (начиная с 1) лучшего положительного пассажа:
+    1 + число пассажей со схожестью строго выше. Схожести разной длины дополняются до
+    матрицы значениями -inf, поэтому расчет идет векторно, без сортировки и цикла по запросам
+
+    Args:
+        similarities: список списков схожестей запросов с документами
+        positive_indices_list: список списков индексов положительных пассажей
+
+    Returns:
+        np.ndarray: ранги (float); np.inf для запросов без положительных пассажей
+    """
+    n = len(similarities)
+    if n == 0:
+        return np.empty(0)
+
+    lengths = np.array([len(sim_list) for sim_list in similarities])
+    matrix = np.full((n, max(lengths.max(), 1)), -np.inf)
+    matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = np.concatenate(
+        [np.asarray(sim_list, dtype=np.float64) for sim_list in similarities])
+
+    positive_counts = np.array([len(indices) for indices in positive_indices_list])
+    positive_mask = np.zeros(matrix.shape, dtype=bool)
+    positive_mask[np.repeat(np.arange(n), positive_counts),
+                  np.concatenate([np.asarray(indices, dtype=np.intp) for indices in positive_indices_list])] = True
+
+    best_positive = np.where(positive_mask, matrix, -np.inf).max(axis=1)
+    ranks = (matrix > best_positive[:, None]).sum(axis=1) + 1.0
+    ranks[positive_counts == 0] = np.inf
+    return ranks
+
+
 # Функция для расчета Top-k accuracy
 def calculate_topk_accuracy(similarities, positive_indices_list, k=3):
     """
@@ -61,18 +125,9 @@ def calculate_topk_accuracy(similarities, positive_indices_list, k=3):
     Returns:
         float: Top-k accuracy (от 0 до 1)
     """
-    correct = 0
-    total = len(similarities)
-
-    for i, sim_list in enumerate(similarities):
-        # Получаем индексы топ-k пассажей с наивысшим сходством
-        top_indices = np.argsort(sim_list)[-k:]
-
-        # Проверяем, есть ли хотя бы один положительный пассаж в топ-k
-        if any(pos_idx in top_indices for pos_idx in positive_indices_list[i]):
-            correct += 1
-
-    return correct / total if total > 0 else 0.0
+    # Хотя бы один положительный пассаж в топ-k, если лучший из них имеет ранг не больше k
+    ranks = first_positive_ranks(similarities, positive_indices_list)
+    return float((ranks <= k).mean()) if len(ranks) > 0 else 0.0
 
 
 # Функция для расчета MRR (Mean Reciprocal Rank)
@@ -88,32 +143,48 @@ def calculate_mrr(similarities, positive_indices_list):
     Returns:
         float: MRR значение (от 0 до 1)
     """
-    reciprocal_ranks = []
+    # Для запросов без положительных пассажей ранг бесконечен, обратный ранг равен 0
+    ranks = first_positive_ranks(similarities, positive_indices_list)
+    return float((1.0 / ranks).mean()) if len(ranks) > 0 else 0.0
+
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Все неудачные запросы построчно пишутся в JSONL-файл; в памяти для итоговой сводки остаются только первые
+FAILED_ITEMS_FILE = "kazqad_failed.jsonl"
+FAILED_ITEMS_SHOWN = 10
+
 
-    for i, sim_list in enumerate(similarities):
-        # Сортируем индексы по убыванию схожести
-        sorted_indices = np.argsort(sim_list)[::-1]
+@lru_cache(maxsize=4)
+def load_embedding_model(model_name, device):
+    """
+    Load the embedding model: FP16 on GPU, ONNX Runtime backend on CPU when it is installed.
+    Cached per process, so repeated test_retrieval_system calls reuse the loaded model
+    """
+    if device == 'cuda':
+        model = SentenceTransformer(model_name, device=device)
+        model.half()
+        return model
 
-        # Находим ранг первого положительного пассажа
-        for rank, idx in enumerate(sorted_indices, 1):
-            if idx in positive_indices_list[i]:
-                reciprocal_ranks.append(1.0 / rank)
-                break
-        else:
-            # Если положительный пассаж не найден
-            reciprocal_ranks.append(0.0)
+    if onnxruntime is not None:
+        try:
+            # backend="onnx" (sentence-transformers >= 3.2) экспортирует модель через optimum при первом запуске
+            return SentenceTransformer(model_name, device=device, backend="onnx")
+        except Exception as e:
+            logger.warning(f"ONNX backend unavailable, falling back to PyTorch: {e}")
 
-    return np.mean(reciprocal_ranks) if reciprocal_ranks else 0.0
+    return SentenceTransformer(model_name, device=device)
 
 
 # Основная функция тестирования
 def test_retrieval_system(dataset, api_url, model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-                          batch_size=1, delay=0.1):
-    """Test the retrieval system with the KazQAD dataset"""
-    # Загружаем модель для создания эмбеддингов
+                          batch_size=1, delay=0.0, concurrency=16):
+    """Test the retrieval system with the KazQAD dataset, keeping up to `concurrency` requests in flight"""
+    # Загружаем модель для создания эмбеддингов; на GPU инференс в FP16, на CPU - ONNX Runtime, если установлен
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
     try:
-        model = SentenceTransformer(model_name)
-        logger.info(f"Successfully loaded model: {model_name}")
+        model = load_embedding_model(model_name, device)
+        logger.info(f"Successfully loaded model: {model_name} ({device})")
     except Exception as e:
         logger.error(f"Failed to load model: {e}")
         raise
@@ -128,108 +199,148 @@ def test_retrieval_system(dataset, api_url, model_name="sentence-transformers/pa
         "mrr": 0.0
     }
 
-    all_queries = []
+    all_positives = []
+    all_negatives = []
+    all_passages = []
+    passage_offsets = []
     all_similarities = []
     all_positive_indices = []
 
-    for i, item in enumerate(tqdm(dataset, desc="Testing queries")):
-        # Извлекаем запрос
-        query = item["query"]
-        all_queries.append(query)
-
-        # Проверяем структуру positive_passages и negative_passages
-        if len(item["positive_passages"]) > 0:
-            if isinstance(item["positive_passages"][0], dict) and "text" in item["positive_passages"][0]:
-                positive = [p["text"] for p in item["positive_passages"]]
-            else:
-                positive = item["positive_passages"]
-        else:
-            positive = []
+    extract_positive = make_passage_extractor(dataset, "positive_passages")
+    extract_negative = make_passage_extractor(dataset, "negative_passages")
 
-        if len(item["negative_passages"]) > 0:
-            if isinstance(item["negative_passages"][0], dict) and "text" in item["negative_passages"][0]:
-                negative = [n["text"] for n in item["negative_passages"]]
-            else:
-                negative = item["negative_passages"]
-        else:
-            negative = []
+    # Столбцы извлекаются целиком: одно преобразование Arrow -> Python на столбец вместо словаря на каждую строку
+    query_ids = dataset["query_id"]
+    all_queries = dataset["query"]
 
-        # Собираем все passages для запроса
-        all_passages = positive + negative
+    # Первый проход: собираем passages всего датасета без вызовов модели
+    for positive_passages, negative_passages in zip(dataset["positive_passages"], dataset["negative_passages"]):
+        positive = extract_positive(positive_passages)
+        negative = extract_negative(negative_passages)
 
-        # Запоминаем индексы положительных passages для этого запроса
-        positive_indices = list(range(len(positive)))
-        all_positive_indices.append(positive_indices)
+        all_positives.append(positive)
+        all_negatives.append(negative)
 
-        # Создаем эмбеддинги для запроса и passages
-        query_embedding = model.encode(query)
-        passage_embeddings = model.encode(all_passages)
+        # Собираем все passages для запроса в общий список; для элемента запоминаем его срез
+        start = len(all_passages)
+        all_passages.extend(positive)
+        all_passages.extend(negative)
+        passage_offsets.append((start, len(all_passages)))
 
-        # Рассчитываем косинусную схожесть
-        similarities = cosine_similarity([query_embedding], passage_embeddings)[0]
+        # Запоминаем индексы положительных passages для этого запроса
+        all_positive_indices.append(list(range(len(positive))))
+
+    # Создаем эмбеддинги для всех запросов и passages батчами, а не по одному вызову на элемент;
+    # эмбеддинги L2-нормализованы, поэтому косинусная схожесть равна скалярному произведению.
+    # Тензоры остаются на устройстве модели: на GPU эмбеддинги не копируются в память CPU
+    query_embeddings = model.encode(all_queries, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=True,
+                                    convert_to_tensor=True, normalize_embeddings=True)
+    passage_embeddings = model.encode(all_passages, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=True,
+                                      convert_to_tensor=True, normalize_embeddings=True)
+
+    # Схожесть каждого passage со своим запросом одной операцией на устройстве (в float32):
+    # построчное скалярное произведение с эмбеддингом запроса-владельца. В память CPU копируется
+    # только итоговый вектор схожестей
+    device = passage_embeddings.device
+    passage_counts = torch.tensor([end - start for start, end in passage_offsets], device=device)
+    owners = torch.repeat_interleave(torch.arange(len(passage_offsets), device=device), passage_counts)
+    flat_similarities = (passage_embeddings.float() * query_embeddings.float()[owners]).sum(dim=1).cpu().numpy()
+
+    # Payloads формируются в одном быстром цикле после кодирования: время запуска общее для всех запросов;
+    # ticket_id в виде 32 hex-символов (UUID без дефисов) принимается схемой события
+    timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    uuid4 = uuid.uuid4
+    payloads = []
+    for i, query_id in enumerate(query_ids):
+        query = all_queries[i]
+        positive_indices = all_positive_indices[i]
+        start, end = passage_offsets[i]
+
+        # Косинусные схожести passages этого запроса
+        similarities = flat_similarities[start:end]
         all_similarities.append(similarities)
 
         # Формируем запрос для API
         data = {
-            "query_id": item["query_id"],
+            "query_id": query_id,
             "query": query,
-            "positive": positive,
-            "negative": negative,
-            "ticket_id": str(uuid.uuid4()),
-            "timestamp": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "positive": all_positives[i],
+            "negative": all_negatives[i],
+            "ticket_id": uuid4().hex,
+            "timestamp": timestamp,
             "from_email": "user@example.com",
             "to_email": "dockerDatabase@example.com",
             "sender": "KazQAD Test",
-            "subject": f"Query: {item['query_id']}",
+            "subject": f"Query: {query_id}",
             "body": query
         }
+        body = orjson.dumps(data)
+        payloads.append((query_id, body))
 
         # Добавим отладочную информацию для первого запроса
         if i == 0:
             try:
-                logger.info(f"Sample request data: {json.dumps(data, ensure_ascii=False)[:500]}...")
+                logger.info(f"Sample request data: {body.decode()[:500]}...")
 
                 # Выводим примеры схожестей для отладки
                 sorted_sim_indices = np.argsort(similarities)[::-1]
                 logger.info("Top-3 similarities for first query:")
-                for idx in sorted_sim_indices[:3]:
-                    is_positive = idx in positive_indices
+                positive_set = set(positive_indices)
+                for rank, idx in enumerate(sorted_sim_indices[:3], 1):
+                    is_positive = idx in positive_set
                     logger.info(
-                        f"  Rank {list(sorted_sim_indices).index(idx) + 1}: {similarities[idx]:.4f} {'(positive)' if is_positive else '(negative)'}")
+                        f"  Rank {rank}: {similarities[idx]:.4f} {'(positive)' if is_positive else '(negative)'}")
             except UnicodeEncodeError:
                 print("⚠ Не удалось вывести Kazakh текст в консоль (logger), но всё работает.")
 
+    total = len(payloads)
+    # Счётчики и файл неудачных запросов обновляются из нескольких потоков
+    lock = threading.Lock()
+
+    def record_failure(error_info):
+        with lock:
+            results["failed"] += 1
+            if len(results["failed_items"]) < FAILED_ITEMS_SHOWN:
+                results["failed_items"].append(error_info)
+            failed_file.write(orjson.dumps(error_info) + b"\n")
+
+    def send_one(i, query_id, body):
         try:
             # Отправляем запрос к API
-            response = requests.post(api_url, json=data, timeout=30)
+            response = session.post(api_url, data=body, headers=JSON_HEADERS, timeout=30)
             if response.status_code in [200, 202]:
-                results["successful"] += 1
-                logger.debug(f"Item {i + 1}/{len(dataset)}: Success")
+                with lock:
+                    results["successful"] += 1
+                logger.debug(f"Item {i + 1}/{total}: Success")
             else:
-                results["failed"] += 1
                 error_info = {
-                    "query_id": item["query_id"],
+                    "query_id": query_id,
                     "status_code": response.status_code,
                     "response": response.text[:100] + "..." if len(response.text) > 100 else response.text
                 }
-                results["failed_items"].append(error_info)
-                logger.warning(f"Item {i + 1}/{len(dataset)}: Failed with status {response.status_code}")
+                record_failure(error_info)
+                logger.warning(f"Item {i + 1}/{total}: Failed with status {response.status_code}")
         except Exception as e:
-            results["failed"] += 1
             error_info = {
-                "query_id": item["query_id"],
+                "query_id": query_id,
                 "exception": str(e)
             }
-            results["failed_items"].append(error_info)
-            logger.error(f"Item {i + 1}/{len(dataset)}: Exception - {e}")
+            record_failure(error_info)
+            logger.error(f"Item {i + 1}/{total}: Exception - {e}")
 
-        # Добавляем задержку между запросами
-        if delay > 0 and i < len(dataset) - 1:
+        # Необязательная задержка для ограничения скорости: занимает поток пула
+        if delay > 0:
             time.sleep(delay)
 
-        # Логируем прогресс каждые batch_size элементов
-        if (i + 1) % batch_size == 0:
-            logger.info(f"Progress: {i + 1}/{len(dataset)} items processed")
+    # Запросы к API ограничены сетью, а не CPU: потоки пула ждут ответа параллельно
+    with open(FAILED_ITEMS_FILE, "wb") as failed_file, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(send_one, i, query_id, body) for i, (query_id, body) in enumerate(payloads)]
+        # Прогрессбар перерисовывается не чаще раза в секунду, а не на каждый ответ
+        progress = tqdm(as_completed(futures), total=total, desc="Testing queries", mininterval=1.0)
+        for done, _ in enumerate(progress, 1):
+            # Логируем прогресс каждые batch_size элементов
+            if done % batch_size == 0:
+                logger.info(f"Progress: {done}/{total} items processed")
 
     # Рассчитываем Top-k accuracy для разных значений k
     for k in [1, 3, 5, 10]:
@@ -265,7 +376,7 @@ def print_summary(results):
 
     if results["failed_items"]:
         logger.info("\nFailed Items:")
-        for item in results["failed_items"][:10]:
+        for item in results["failed_items"]:
             logger.info(f"- Query ID: {item['query_id']}")
             if "status_code" in item:
                 logger.info(f"  Status: {item['status_code']}")
@@ -273,8 +384,8 @@ def print_summary(results):
             else:
                 logger.info(f"  Exception: {item['exception']}")
 
-        if len(results["failed_items"]) > 10:
-            logger.info(f"... and {len(results['failed_items']) - 10} more failures (see log file)")
+        if results["failed"] > len(results["failed_items"]):
+            logger.info(f"... and {results['failed'] - len(results['failed_items'])} more failures (see {FAILED_ITEMS_FILE})")
 
 
 def main():
@@ -287,8 +398,10 @@ def main():
                         help="Dataset split to use (default: test)")
     parser.add_argument("--batch-size", type=int, default=10,
                         help="Log progress every N items (default: 10)")
-    parser.add_argument("--delay", type=float, default=0.1,
-                        help="Delay between requests in seconds (default: 0.1)")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Delay after each request per worker thread, for rate limiting (default: 0)")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Number of requests in flight (default: 16)")
     parser.add_argument("--model", default="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
                         help="Model name for creating embeddings (default: sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2)")
 
@@ -299,6 +412,7 @@ def main():
     logger.info(f"Dataset split: {args.split}")
     logger.info(f"Item limit: {args.limit if args.limit else 'None (using all items)'}")
     logger.info(f"Request delay: {args.delay} seconds")
+    logger.info(f"Concurrency: {args.concurrency}")
     logger.info(f"Model: {args.model}")
 
     # Load the dataset
@@ -311,7 +425,8 @@ def main():
         args.api_url,
         model_name=args.model,
         batch_size=args.batch_size,
-        delay=args.delay
+        delay=args.delay,
+        concurrency=args.concurrency
     )
     end_time = time.time()
 